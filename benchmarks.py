@@ -0,0 +1,642 @@
+# benchmarks.py - PERFORMANCE BENCHMARKS (run: python benchmarks.py [name])
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+from encryption import EncryptionManager
+from credential_record import Credential, CredentialIndex, password_strength, search_credentials
+from vault_journal import VaultJournal
+from vault_shards import ShardedVaultStore
+from storage import JsonKeyValueStore
+from store_cache import store_cache
+from durable_io import atomic_write_json, flush_pending, load_json
+
+
+def timed(func, repeat=3):
+    """Best wall-clock time of func() over repeat runs"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+# ---------------- Batch Decrypt Crossover ----------------
+def bench_batch_decrypt(sizes=(64, 256, 512, 1024, 4096, 16384)):
+    """Serial vs thread-pool decrypt_many; reports where the pool starts to win"""
+    encryption = EncryptionManager()
+    # Always measure a real pool, even on a single-core machine
+    encryption.batch_workers = max(2, encryption.batch_workers)
+    print(f"cpus: {os.cpu_count()}  pool workers: {encryption.batch_workers}")
+    print(f"{'size':>8} {'serial ms':>10} {'pool ms':>10} {'speedup':>8}")
+
+    results = []
+    for size in sizes:
+        tokens = encryption.encrypt_many(f"service-{i}.example.com" for i in range(size))
+
+        encryption.batch_threshold = float("inf")
+        serial = timed(lambda: encryption.decrypt_many(tokens))
+        encryption.batch_threshold = 0
+        pooled = timed(lambda: encryption.decrypt_many(tokens))
+
+        speedup = serial / pooled
+        results.append((size, speedup))
+        print(f"{size:>8} {serial * 1000:>10.1f} {pooled * 1000:>10.1f} {speedup:>7.2f}x")
+
+    encryption.shutdown()
+
+    # Smallest size from which the pool wins clearly at every larger size
+    crossover = None
+    for size, speedup in reversed(results):
+        if speedup < 1.1:
+            break
+        crossover = size
+    print(f"crossover: {crossover if crossover else 'pool never faster on this machine'}")
+    return crossover
+
+
+# ---------------- Bytes vs Str API ----------------
+def bench_bytes_api(calls=5_000, repeat=7):
+    """Per-call cost of the str wrappers over the bytes-native encryption API"""
+    encryption = EncryptionManager()
+    fields = {"service": "service-1.example.com", "username": "user1@example.com",
+              "password": "Pw!00000001xyz", "category": "General", "strength": "Strong"}
+    text = fields["service"]
+    data = text.encode()
+    token = encryption.encrypt_bytes(data)
+    token_text = token.decode()
+    envelope = encryption.seal_envelope(fields, "cred-1")
+    envelope_text = encryption.encrypt_record(fields, "cred-1")
+
+    pairs = (
+        ("encrypt", lambda: encryption.encrypt(text), lambda: encryption.encrypt_bytes(data)),
+        ("decrypt", lambda: encryption.decrypt(token_text), lambda: encryption.decrypt_bytes(token)),
+        ("seal", lambda: encryption.encrypt_record(fields, "cred-1"),
+         lambda: encryption.seal_envelope(fields, "cred-1")),
+        ("open", lambda: encryption.decrypt_record(envelope_text, "cred-1"),
+         lambda: encryption.open_envelope(envelope, "cred-1")),
+    )
+    print(f"{'call':>8} {'str us':>8} {'bytes us':>9} {'overhead':>9}")
+    for name, str_call, bytes_call in pairs:
+        def loop(call):
+            return lambda: [call() for _ in range(calls)]
+        # Best of several runs: the difference is small next to the cipher itself
+        str_time = timed(loop(str_call), repeat) / calls
+        bytes_time = timed(loop(bytes_call), repeat) / calls
+        print(f"{name:>8} {str_time * 1e6:>8.2f} {bytes_time * 1e6:>9.2f} "
+              f"{(str_time - bytes_time) / str_time:>8.0%}")
+    encryption.shutdown()
+
+
+# ---------------- Login Unlock ----------------
+def bench_unlock():
+    """Login cost: bcrypt check plus the vault key's scrypt derivation, serial vs overlapped"""
+    import bcrypt
+    from concurrent.futures import ThreadPoolExecutor
+    from vault_keys import derive_wrapping_key, kdf_params
+    password = "BenchPass123!"
+    hashed = bcrypt.hashpw(password.encode(), bcrypt.gensalt())
+    params = kdf_params()
+
+    def check():
+        return bcrypt.checkpw(password.encode(), hashed)
+
+    def derive():
+        return derive_wrapping_key(password, params)
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        def overlapped():
+            # What handle_login does
+            derivation = pool.submit(derive)
+            check()
+            derivation.result()
+
+        results = (("bcrypt", timed(check)), ("scrypt", timed(derive)),
+                   ("serial", timed(lambda: (check(), derive()))), ("parallel", timed(overlapped)))
+    print(f"cpus: {os.cpu_count()}  scrypt n={params['n']} r={params['r']} p={params['p']}")
+    for name, seconds in results:
+        print(f"{name:>9} {seconds * 1000:>7.0f} ms")
+
+
+# ---------------- Credential Memory ----------------
+def measure_allocations(build):
+    """Bytes still allocated by the object returned from build()"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return after - before
+
+
+def bench_credential_memory(sizes=(10_000, 100_000)):
+    """Per-entry dicts vs slotted Credential objects, measured with tracemalloc"""
+    print(f"{'size':>8} {'dict MB':>9} {'slots MB':>9} {'saved':>7}")
+    for size in sizes:
+        # Same field values in both layouts; the token stands in for a Fernet string
+        token = "gAAAAA" + "x" * 94
+        rows = [(f"cred-{i:08d}", f"service-{i}.example.com", f"user{i}@example.com")
+                for i in range(size)]
+
+        dict_bytes = measure_allocations(lambda: [
+            {'id': cid, 'service': service, 'username': username, 'password': token,
+             'category': 'General', 'strength': 'Strong'}
+            for cid, service, username in rows
+        ])
+        slot_bytes = measure_allocations(lambda: [
+            Credential(service, username, id=cid, strength='Strong',
+                       password_token=token)
+            for cid, service, username in rows
+        ])
+
+        saved = 1 - slot_bytes / dict_bytes
+        print(f"{size:>8} {dict_bytes / 1e6:>9.2f} {slot_bytes / 1e6:>9.2f} {saved:>6.0%}")
+
+
+# ---------------- Vault Container ----------------
+def bench_container(size=50_000):
+    """Cold save/load of one vault as indented JSON vs the binary and mapped formats"""
+    encryption = EncryptionManager()
+    records = []
+    for i in range(size):
+        cred = Credential(f"service-{i}.example.com", f"user{i}@example.com", f"Pw!{i:08d}xyz",
+                          strength="Strong")
+        records.append(cred.to_record(encryption))
+    vault = {"bench.user": records}
+
+    print(f"{'format':>8} {'save ms':>9} {'load ms':>9} {'open ms':>9} {'page ms':>9} {'size MB':>9}")
+    for name, path in (("json", "bench.json"), ("binary", "bench.vlt"), ("mapped", "bench.vmap")):
+        def save():
+            journal = VaultJournal(path, path + ".journal")
+            journal.replace({user: {r["id"]: r for r in recs} for user, recs in vault.items()})
+
+        def load():
+            return VaultJournal(path, path + ".journal").get_user_records("bench.user")
+
+        save_time = timed(save)
+        load_time = timed(load)
+        # Cold open as the dashboard does it: parse plus decrypt every record
+        open_time = timed(lambda: encryption.open_records(load()), repeat=1)
+        # First dashboard screen only; a mapped snapshot skips the other records
+        page_time = timed(lambda: encryption.open_records(
+            VaultJournal(path, path + ".journal").page_user_records("bench.user", 0, 100)))
+        print(f"{name:>8} {save_time * 1000:>9.0f} {load_time * 1000:>9.0f} {open_time * 1000:>9.0f} "
+              f"{page_time * 1000:>9.1f} {os.path.getsize(path) / 1e6:>9.2f}")
+    encryption.shutdown()
+
+
+# ---------------- Streaming Import ----------------
+def bench_import(size=10_000):
+    """Import a browser-style CSV export; one put_many per chunk"""
+    import csv
+    from vault_import import import_credentials
+    with open("export.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "url", "username", "password", "note"])
+        for i in range(size):
+            writer.writerow([f"service-{i}", f"https://service-{i}.example.com/login",
+                             f"user{i}@example.com", f"Pw!{i:08d}xyz", ""])
+
+    encryption = EncryptionManager()
+    vault = ShardedVaultStore("vault", "vault.json", "vault.journal")
+    vault.initialize()
+    result = import_credentials("export.csv", "bench.user", vault, encryption)
+    vault.close()
+    encryption.shutdown()
+    print(f"{size} rows: {result.summary()}, {result.chunks} chunks")
+
+
+# ---------------- Cipher Suites ----------------
+def bench_ciphers(size=10_000):
+    """Seal and open the same records with every cipher suite, then the startup self-benchmark's pick"""
+    from cipher_suites import SUITES, benchmark_suites, fastest_suite
+    encryption = EncryptionManager()
+    credentials = synthetic_credentials(size)
+    for name in SUITES:
+        encryption.write_suite = name
+        start = time.perf_counter()
+        records = [{"id": cred_id, "envelope": envelope}
+                   for (_, cred_id), envelope in zip(credentials, encryption.seal_records(credentials))]
+        sealed = time.perf_counter() - start
+        start = time.perf_counter()
+        encryption.open_records(records)
+        opened = time.perf_counter() - start
+        size_bytes = sum(len(record["envelope"]) for record in records)
+        print(f"{name:<18} seal: {sealed * 1000:7.1f} ms  open: {opened * 1000:7.1f} ms  "
+              f"stored: {size_bytes / size:6.1f} bytes/record")
+
+    start = time.perf_counter()
+    timings = benchmark_suites()
+    print(f"self-benchmark: {(time.perf_counter() - start) * 1000:.1f} ms, picks {fastest_suite()} "
+          f"({', '.join(f'{name} {seconds * 1000:.2f} ms' for name, seconds in timings.items())})")
+    encryption.shutdown()
+
+
+# ---------------- Blind Index Search ----------------
+def bench_search(size=20_000):
+    """Exact and domain lookups from the blind index versus decrypting the whole vault first"""
+    from blind_index import search_vault
+    encryption = EncryptionManager()
+    vault = ShardedVaultStore("vault", "vault.json", "vault.journal")
+    vault.initialize()
+    credentials = synthetic_credentials(size)
+    vault.put_many("bench", [Credential.seal(cred_id, fields, encryption) for fields, cred_id in credentials])
+    exact = credentials[size // 2][0]["service"].upper()
+    queries = (("exact", exact), ("domain", "example.co.uk"))
+
+    for name, query in queries:
+        start = time.perf_counter()
+        records = vault.get_user_records("bench")
+        opened = encryption.open_records(records)
+        scan = search_credentials([Credential.from_record(record, fields, encryption)
+                                   for record, fields in zip(records, opened)], query.lower())
+        full = time.perf_counter() - start
+
+        start = time.perf_counter()
+        hits = search_vault(vault, encryption, "bench", query)
+        indexed = time.perf_counter() - start
+        print(f"{name:<7} {len(hits):>6} hits ({len(scan)} by substring)  "
+              f"decrypt all: {full * 1000:8.1f} ms  index: {indexed * 1000:8.1f} ms  "
+              f"({full / indexed:.1f}x)")
+    vault.close()
+    encryption.shutdown()
+
+
+# ---------------- Key Rotation ----------------
+def bench_rotation(size=20_000):
+    """Re-encrypt a vault under a new installation key in background-sized batches"""
+    from key_rotation import KeyRotation, summary
+    encryption = EncryptionManager()
+    vault = ShardedVaultStore("vault", "vault.json", "vault.journal")
+    vault.initialize()
+    credentials = synthetic_credentials(size)
+    envelopes = encryption.seal_records(credentials)
+    for user in range(4):
+        vault.put_many(f"bench.user{user}", [{"id": cred_id, "envelope": envelope}
+                                             for (_, cred_id), envelope in zip(credentials, envelopes)
+                                             if int(cred_id, 16) % 4 == user])
+
+    rotation = KeyRotation(encryption, vault, JsonKeyValueStore("users.json"))
+    batches = []
+
+    def progress(state):
+        batches.append(state["scanned"])
+
+    start = time.perf_counter()
+    state = rotation.run(progress)
+    elapsed = time.perf_counter() - start
+    vault.close()
+
+    # Only the new key is left; every record must open with it
+    fresh = EncryptionManager()
+    reopened = open_vault("vault")
+    opened = sum(len(fresh.open_records(reopened.get_user_records(f"bench.user{user}"))) for user in range(4))
+    print(summary(state))
+    print(f"{len(batches)} batches, {state['scanned'] / elapsed:.0f} records/s end to end (both passes), "
+          f"keys left: {len(fresh.read_keys())}, reopened: {opened}/{size}")
+    encryption.shutdown()
+    fresh.shutdown()
+
+
+# ---------------- Multi-Process Stress ----------------
+def concurrency_worker(worker_id, rounds):
+    """One app instance: interleaved user, audit and vault saves"""
+    from audit_log import AuditLog
+    users = JsonKeyValueStore("users.json")
+    vault = ShardedVaultStore("vault", "vault.json", "vault.journal")
+    vault.initialize()
+    for i in range(rounds):
+        users.put(f"user-{worker_id}-{i}", {"round": i})
+        AuditLog.log_event("STRESS", "INFO", f"{worker_id}-{i}", "stress", ip_address="127.0.0.1")
+        vault.put("shared.user", {"id": f"{worker_id}-{i}", "envelope": "c3RyZXNz"})
+        vault.put(f"worker-{worker_id}", {"id": f"{worker_id}-{i}", "envelope": "c3RyZXNz"})
+        flush_pending()   # one physical write per round instead of one per window
+    vault.close()
+
+
+def bench_concurrency(workers=4, rounds=50):
+    """Several processes saving to the same stores at once; fails if any save is lost"""
+    start = time.perf_counter()
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=concurrency_worker, args=(w, rounds)) for w in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    expected = workers * rounds
+    vault = ShardedVaultStore("vault", "vault.json", "vault.journal")
+    vault.initialize()
+    found = {
+        "users": len(JsonKeyValueStore("users.json").all()),
+        "audit": len(load_json("audit_logs.json", [])),
+        "vault": len(vault.get_user_records("shared.user")),
+        "shards": sum(len(vault.get_user_records(f"worker-{w}")) for w in range(workers)),
+    }
+    print(f"{workers} processes x {rounds} rounds in {elapsed:.2f}s")
+    for store, count in found.items():
+        print(f"{store:>8} {count:>6} / {expected}")
+    lost = {store: expected - count for store, count in found.items() if count != expected}
+    if lost:
+        raise RuntimeError(f"Lost updates: {lost}")
+
+# ---------------- Synthetic Data ----------------
+SEED = 20240115
+SERVICES = ("github", "gmail", "outlook", "amazon", "netflix", "spotify", "slack", "zoom",
+            "dropbox", "paypal", "linkedin", "twitter", "reddit", "steam", "adobe", "notion")
+DOMAINS = ("com", "org", "net", "io", "dev", "co.uk")
+CATEGORIES = ("General", "Email", "Social", "Work", "Finance", "Shopping", "Entertainment")
+AUDIT_EVENTS = (("LOGIN_SUCCESS", "INFO"), ("LOGIN_FAILED", "WARNING"), ("PASSWORD_ADDED", "INFO"),
+                ("PASSWORD_VIEWED", "WARNING"), ("PASSWORD_EDITED", "INFO"),
+                ("PASSWORD_DELETED", "CRITICAL"), ("WEAK_PASSWORD_DETECTED", "WARNING"))
+# One bcrypt hash (lowest cost, fixed salt) shared by every synthetic user
+USER_PASSWORD = b"BenchPass123!"
+USER_SALT = b"$2b$04$SyntheticVaultBenchSa."
+
+
+def synthetic_rng(seed, stream):
+    """Independent generator per data set, so adding one set never shifts another"""
+    return random.Random(f"{seed}:{stream}")
+
+
+def synthetic_users(count, seed=SEED):
+    """{username: user data} shaped like the users store"""
+    import bcrypt
+    rng = synthetic_rng(seed, "users")
+    password_hash = bcrypt.hashpw(USER_PASSWORD, USER_SALT).decode()
+    created = datetime(2024, 1, 1)
+    users = {}
+    for i in range(count):
+        username = f"user{i:06d}.{rng.choice(SERVICES)}"
+        users[username] = {
+            "name": f"Synthetic User {i}",
+            "password": password_hash,
+            "email": f"{username}@example.{rng.choice(DOMAINS)}",
+            "created": (created + timedelta(days=rng.randrange(730))).strftime("%Y-%m-%d"),
+        }
+    return users
+
+
+def synthetic_password(rng):
+    """About one in four is weak, like a real vault"""
+    if rng.random() < 0.25:
+        return rng.choice(SERVICES) + str(rng.randrange(1000))
+    alphabet = "abcdefghijkmnopqrstuvwxyzABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+    body = "".join(rng.choice(alphabet) for _ in range(rng.randrange(10, 20)))
+    return body + rng.choice("!@#$%^&*") + str(rng.randrange(10))
+
+
+def synthetic_credentials(count, seed=SEED):
+    """[(plaintext fields, credential id)] for one user's vault, as seal_records takes them"""
+    rng = synthetic_rng(seed, "credentials")
+    credentials = []
+    for i in range(count):
+        service = f"{rng.choice(SERVICES)}-{i}.example.{rng.choice(DOMAINS)}"
+        password = synthetic_password(rng)
+        fields = {
+            "service": service,
+            "username": f"{rng.choice(SERVICES)}{rng.randrange(10_000)}@example.com",
+            "password": password,
+            "category": rng.choice(CATEGORIES),
+            "strength": password_strength(password),
+        }
+        credentials.append((fields, uuid.UUID(int=rng.getrandbits(128)).hex))
+    return credentials
+
+
+def synthetic_audit_logs(count, users, seed=SEED):
+    """Audit log entries for users, oldest first"""
+    rng = synthetic_rng(seed, "audit")
+    users = list(users)
+    timestamp = datetime(2024, 1, 1)
+    logs = []
+    for _ in range(count):
+        timestamp += timedelta(seconds=rng.randrange(1, 600))
+        event_type, severity = rng.choice(AUDIT_EVENTS)
+        logs.append({
+            "timestamp": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+            "event_type": event_type,
+            "severity": severity,
+            "description": f"Service: {rng.choice(SERVICES)} | Synthetic event",
+            "user": rng.choice(users),
+            "ip_address": f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}",
+        })
+    return logs
+
+
+# ---------------- Vault Suite ----------------
+SUITE_SIZES = (100, 1_000, 10_000, 100_000)
+SUITE_VERSION = 1
+SEARCH_TERMS = ("git", "example.io", "user", "netflix-99", "no-such-service")
+AUDIT_APPENDS = 50
+
+
+def git_revision():
+    """(commit, has uncommitted changes) of the tree the benchmarks run from"""
+    tree = os.path.dirname(os.path.realpath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=tree,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=tree,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+
+def open_vault(directory):
+    vault = ShardedVaultStore(directory, directory + ".json", directory + ".journal")
+    vault.initialize()
+    return vault
+
+
+def decrypt_vault(records, encryption):
+    """What SecureVaultApp.read_credentials does after reading the records"""
+    opened = encryption.open_records(records)
+    return CredentialIndex(Credential.from_record(record, fields, encryption)
+                           for record, fields in zip(records, opened))
+
+
+def run_suite_size(size, encryption, seed):
+    """Time the headless paths behind login, the dashboard and saves at one vault size"""
+    users = synthetic_users(size, seed)
+    owner = next(iter(users))
+    credentials = synthetic_credentials(size, seed)
+    directory = f"vault-{size}"
+    timings = {}
+    from audit_log import AuditLog
+
+    # Users and audit stores as a long-running install would have them
+    atomic_write_json("users.json", users)
+    atomic_write_json(AuditLog.LOG_FILE, synthetic_audit_logs(size, users, seed), indent=2)
+
+    def login_lookup():
+        store_cache.invalidate("users.json")
+        return JsonKeyValueStore("users.json").get(owner)
+    timings["login_lookup"] = timed(login_lookup)
+
+    # Import-style bulk save: seal everything, one put_many
+    def save_bulk():
+        vault = open_vault(directory)
+        envelopes = encryption.seal_records(credentials)
+        vault.put_many(owner, [{"id": cred_id, "envelope": envelope}
+                               for (_, cred_id), envelope in zip(credentials, envelopes)])
+        vault.close()
+    timings["save_bulk"] = timed(save_bulk, repeat=1)
+
+    # Cold load as at login: a fresh store instance parses the shard
+    timings["load"] = timed(lambda: open_vault(directory).get_user_records(owner))
+    records = open_vault(directory).get_user_records(owner)
+    timings["decrypt"] = timed(lambda: decrypt_vault(records, encryption), repeat=1)
+    timings["first_page"] = timed(lambda: decrypt_vault(
+        open_vault(directory).page_user_records(owner, 0, 100), encryption))
+
+    index = decrypt_vault(records, encryption)
+    timings["search"] = timed(lambda: [search_credentials(index, term) for term in SEARCH_TERMS]) / len(SEARCH_TERMS)
+
+    # update_vault_data for one edited credential: snapshot, seal, journal append
+    vault = open_vault(directory)
+    cred = next(iter(index))
+    def save_edit():
+        cred.password = synthetic_password(synthetic_rng(seed, "edit"))
+        vault.put(owner, Credential.seal(cred.id, cred.fields(), encryption))
+    timings["save_edit"] = timed(save_edit)
+    vault.close()
+
+    def audit_append():
+        for i in range(AUDIT_APPENDS):
+            AuditLog.log_event("PASSWORD_VIEWED", "WARNING", f"Service: bench-{i}", owner,
+                               ip_address="127.0.0.1")
+        flush_pending()
+    timings["audit_append"] = timed(audit_append, repeat=1) / AUDIT_APPENDS
+
+    def audit_read():
+        store_cache.invalidate(AuditLog.LOG_FILE)
+        return AuditLog.get_logs_for_user(owner)
+    timings["audit_read"] = timed(audit_read)
+
+    return {name: round(seconds * 1000, 3) for name, seconds in timings.items()}
+
+
+def bench_suite(sizes=SUITE_SIZES, seed=SEED, output=None):
+    """
+    Synthetic vaults at each size through load, decrypt, search, save and
+    audit paths; milliseconds per operation, plus the store cache's hit
+    rates. output: JSON results file that "python benchmarks.py compare
+    OLD NEW" can diff across commits.
+    """
+    encryption = EncryptionManager()
+    commit, dirty = git_revision()
+    results = {
+        "suite": "vault",
+        "version": SUITE_VERSION,
+        "commit": commit,
+        "dirty": dirty,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "seed": seed,
+        "sizes": {},
+    }
+
+    metrics = None
+    for size in sizes:
+        timings = run_suite_size(size, encryption, seed)
+        results["sizes"][str(size)] = timings
+        if metrics is None:
+            metrics = list(timings)
+            print(f"{'size':>8} " + " ".join(f"{name:>13}" for name in metrics))
+        print(f"{size:>8} " + " ".join(f"{timings[name]:>13.2f}" for name in metrics))
+    encryption.shutdown()
+
+    # Parsed-file cache lookups made by every size's stores (store_cache)
+    results["store_cache"] = {store: {"hits": hits, "misses": misses, "hit_rate": rate}
+                              for store, (hits, misses, rate) in store_cache.stats().items()}
+    print(store_cache.report())
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"results: {output}")
+    return results
+
+
+def compare_results(base_file, new_file):
+    """Per size and metric: base ms, new ms and new/base ratio"""
+    with open(base_file) as f:
+        base = json.load(f)
+    with open(new_file) as f:
+        new = json.load(f)
+    print(f"base {base.get('commit') or '?'}  new {new.get('commit') or '?'}")
+    print(f"{'size':>8} {'metric':>13} {'base ms':>10} {'new ms':>10} {'ratio':>7}")
+    for size, timings in new["sizes"].items():
+        for name, value in timings.items():
+            old = base["sizes"].get(size, {}).get(name)
+            if old is None:
+                continue
+            ratio = value / old if old else float("inf")
+            print(f"{size:>8} {name:>13} {old:>10.2f} {value:>10.2f} {ratio:>6.2f}x")
+
+
+BENCHMARKS = {
+    "batch": bench_batch_decrypt,
+    "bytes": bench_bytes_api,
+    "unlock": bench_unlock,
+    "memory": bench_credential_memory,
+    "container": bench_container,
+    "import": bench_import,
+    "ciphers": bench_ciphers,
+    "search": bench_search,
+    "rotation": bench_rotation,
+    "concurrency": bench_concurrency,
+    "suite": bench_suite,
+}
+
+
+if __name__ == "__main__":
+    # python benchmarks.py [name ...] [--sizes 100,1000] [--seed N] [--json results.json]
+    # python benchmarks.py compare base.json new.json
+    args = sys.argv[1:]
+    if args[:1] == ["compare"]:
+        compare_results(args[1], args[2])
+        sys.exit(0)
+
+    names, suite_options = [], {}
+    while args:
+        arg = args.pop(0)
+        if arg == "--sizes":
+            suite_options["sizes"] = [int(size) for size in args.pop(0).split(",")]
+        elif arg == "--seed":
+            suite_options["seed"] = int(args.pop(0))
+        elif arg == "--json":
+            # Resolved before the scratch directory is entered
+            suite_options["output"] = os.path.abspath(args.pop(0))
+        else:
+            names.append(arg)
+
+    # Run in a scratch directory so no real key or vault file is touched; each
+    # benchmark gets its own, so none measures (or trips over) another's stores
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in names or list(BENCHMARKS):
+            flush_pending()   # queued writes use paths relative to the previous directory
+            os.makedirs(os.path.join(workdir, name), exist_ok=True)
+            os.chdir(os.path.join(workdir, name))
+            print(f"== {name} ==")
+            if name == "suite":
+                BENCHMARKS[name](**suite_options)
+            else:
+                BENCHMARKS[name]()
+        flush_pending()
@@ -0,0 +1,161 @@
+# blind_index.py - KEYED BLIND INDEXES FOR SEARCHING ENCRYPTED RECORDS
+"""
+Every stored record carries a blind index next to its envelope:
+
+    {"id": ..., "envelope": ..., "index": ["3f9a61c0d2b7e845", ...]}
+
+Each tag is a truncated HMAC-SHA256 of one search term of the record:
+
+    s:<service>     the service name, case-folded, whitespace collapsed
+    d:<domain>      a domain in the service (URL or host name) or in the
+                    username (e-mail address), and each parent domain, so
+                    "github.com" also finds "gist.github.com"
+
+The HMAC key follows the key that sealed the record (see
+EncryptionManager.index_record): the installation key for version 2/3 and
+legacy records, the user's own vault key for version 4. A search computes
+the query's tags under every key it has and decrypts only the records
+that carry one, plus records saved before indexes existed; the hits are
+then checked against their plaintext, which also drops the rare false
+match of a truncated tag.
+
+Tags reveal which records of a vault share a service or domain, never the
+name itself. Substring search still needs the decrypted names; the
+dashboard has them anyway.
+
+    python blind_index.py search USERNAME QUERY
+    python blind_index.py reindex USERNAME     index records saved before indexes
+"""
+import hashlib
+import hmac
+import re
+import sys
+
+TAG_SIZE = 8
+INDEX_PAGE_SIZE = 500
+
+HOST_PATTERN = re.compile(r"^[a-z0-9-]+(\.[a-z0-9-]+)+$")
+
+
+# ---------------- Search Terms ----------------
+def normalize_service(name):
+    return " ".join(name.casefold().split())
+
+
+def domains_of(text):
+    """The host in a URL, host name or e-mail address, then its parents (at least two labels)"""
+    text = text.strip().casefold()
+    if "@" in text:
+        host = text.rsplit("@", 1)[1]
+    else:
+        host = text.split("://", 1)[-1].split("/", 1)[0].split(":", 1)[0]
+    host = host.rstrip(".")
+    if host.startswith("www."):
+        host = host[4:]
+    if not HOST_PATTERN.match(host):
+        return []
+    labels = host.split(".")
+    return [".".join(labels[i:]) for i in range(len(labels) - 1)]
+
+
+def index_terms(service, username):
+    """Every term a record is indexed under"""
+    terms = {"s:" + normalize_service(service)}
+    terms.update("d:" + domain for domain in domains_of(service) + domains_of(username))
+    return terms
+
+
+def query_terms(query):
+    """Terms a query matches: the service name exactly, or the domain and its subdomains"""
+    terms = {"s:" + normalize_service(query)}
+    domains = domains_of(query)
+    if domains:
+        terms.add("d:" + domains[0])
+    return terms
+
+
+def matches(fields, terms):
+    return not index_terms(fields["service"], fields["username"]).isdisjoint(terms)
+
+
+def compute_tags(key, terms):
+    return sorted(hmac.new(key, term.encode(), hashlib.sha256).digest()[:TAG_SIZE].hex()
+                  for term in terms)
+
+
+# ---------------- Search ----------------
+def search_records(records, encryption, query):
+    """
+    (record, fields) of the records matching query; only candidates from
+    the index are decrypted. Version 4 records are only found while
+    encryption is unlocked with their owner's key.
+    """
+    terms = query_terms(query)
+    wanted = set()
+    for key in encryption.index_keys():
+        wanted.update(compute_tags(key, terms))
+
+    candidates = [record for record in records
+                  if "index" not in record or not wanted.isdisjoint(record["index"])]
+    opened = encryption.open_records(candidates)
+    return [(record, fields) for record, fields in zip(candidates, opened) if matches(fields, terms)]
+
+
+def search_vault(vault_store, encryption, user, query):
+    """Headless search of one user's vault (see search_records)"""
+    return search_records(vault_store.get_user_records(user), encryption, query)
+
+
+def reindex_vault(vault_store, encryption, user):
+    """Add indexes to the user's records that have none; returns how many were updated"""
+    updated = 0
+    position = 0
+    while True:
+        page = vault_store.page_user_records(user, position, INDEX_PAGE_SIZE)
+        missing = [record for record in page if "index" not in record]
+        if missing:
+            opened = encryption.open_records(missing)
+            vault_store.put_many(user, [dict(record, index=encryption.index_record(record, fields))
+                                        for record, fields in zip(missing, opened)])
+            updated += len(missing)
+        position += len(page)
+        if len(page) < INDEX_PAGE_SIZE:
+            return updated
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or (sys.argv[1], len(sys.argv)) not in (("search", 4), ("reindex", 3)):
+        print("usage: python blind_index.py search USERNAME QUERY | reindex USERNAME")
+        sys.exit(1)
+    import getpass
+    import bcrypt
+    from durable_io import flush_pending
+    from encryption import EncryptionManager
+    from storage import get_repository
+    from vault_keys import derive_wrapping_key, kdf_params, unlock_stored_key
+
+    username = sys.argv[2]
+    repository = get_repository()
+    repository.initialize()
+    user_data = repository.users.get(username)
+    password = getpass.getpass(f"Master password for {username}: ")
+    if user_data is None or not bcrypt.checkpw(password.encode(), user_data["password"].encode()):
+        print("Invalid username or password")
+        sys.exit(1)
+
+    manager = EncryptionManager()
+    params = kdf_params(user_data.get("vault_key"))
+    key, user_data = unlock_stored_key(repository.users, username, password, params,
+                                       derive_wrapping_key(password, params), manager.recovery_cipher())
+    manager.unlock(key)
+    try:
+        if sys.argv[1] == "search":
+            for record, fields in search_vault(repository.vault, manager, username, sys.argv[3]):
+                print(f"{record['id']}  {fields['service']}  {fields['username']}")
+        else:
+            print(f"{reindex_vault(repository.vault, manager, username)} records indexed")
+    finally:
+        manager.lock()
+        repository.close()
+        flush_pending()
+        manager.shutdown()
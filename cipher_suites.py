@@ -0,0 +1,152 @@
+# cipher_suites.py - PLUGGABLE AEAD CIPHER SUITES FOR RECORD ENVELOPES
+"""
+Record envelopes are sealed by one of these suites; the envelope's version
+byte names the suite, so each record opens with the suite it was sealed
+with, whatever new writes use (see ENVELOPE_FORMATS in encryption.py).
+
+    aes-256-gcm         the default; fastest where the CPU has AES
+                        instructions
+    chacha20-poly1305   fastest in software (CPUs without AES-NI / ARMv8
+                        crypto extensions)
+    fernet              AES-128-CBC + HMAC-SHA256, the legacy per-field
+                        format, kept for installations that must stay on it
+
+Every suite seals (version prefix, payload, associated data) into
+"prefix | sealed" and opens the part after the prefix, raising InvalidTag
+on any failure. Each gets its own key, derived from the record key
+material with info + suite.label (encryption.derive_suites); AES-256-GCM
+has an empty label, so its keys are those of envelopes sealed before
+suites existed.
+
+New writes use $SECURE_VAULT_CIPHER: a suite name, or "auto" to run
+a short self-benchmark at startup and pick the fastest suite on this CPU.
+
+    python cipher_suites.py     run the self-benchmark
+"""
+import base64
+import os
+import struct
+import sys
+import time
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+
+CIPHER_ENV = "SECURE_VAULT_CIPHER"
+DEFAULT_SUITE = "aes-256-gcm"
+AUTO = "auto"
+
+# Self-benchmark: seal and open a typical deflated payload this many times per suite
+BENCH_PAYLOAD_SIZE = 160
+BENCH_ROUNDS = 200
+
+AAD_LENGTH = struct.Struct("<H")
+
+
+class AeadSuite:
+    """Suite over a cryptography AEAD class taking (nonce, data, associated data)"""
+
+    name = None
+    label = None
+    aead = None
+    nonce_size = 12
+
+    def __init__(self, key):
+        self.cipher = self.aead(key)
+
+    def seal(self, prefix, payload, aad):
+        nonce = os.urandom(self.nonce_size)
+        return b"".join((prefix, nonce, self.cipher.encrypt(nonce, payload, aad)))
+
+    def open(self, sealed, aad):
+        # sealed may be a memoryview: the nonce and ciphertext are not copied
+        return self.cipher.decrypt(sealed[:self.nonce_size], sealed[self.nonce_size:], aad)
+
+
+class AesGcmSuite(AeadSuite):
+    name = "aes-256-gcm"
+    label = b""
+    aead = AESGCM
+
+
+class ChaChaSuite(AeadSuite):
+    name = "chacha20-poly1305"
+    label = b" chacha20-poly1305"
+    aead = ChaCha20Poly1305
+
+
+class FernetSuite:
+    """
+    Fernet has no associated data, so the id is sealed in front of the
+    payload and compared on open. The token is stored decoded (raw bytes).
+    """
+
+    name = "fernet"
+    label = b" fernet"
+
+    def __init__(self, key):
+        self.cipher = Fernet(base64.urlsafe_b64encode(key))
+
+    def seal(self, prefix, payload, aad):
+        token = self.cipher.encrypt(AAD_LENGTH.pack(len(aad)) + aad + payload)
+        return prefix + base64.urlsafe_b64decode(token)
+
+    def open(self, sealed, aad):
+        try:
+            data = self.cipher.decrypt(base64.urlsafe_b64encode(sealed))
+        except InvalidToken:
+            raise InvalidTag() from None
+        (length,) = AAD_LENGTH.unpack_from(data, 0)
+        if data[AAD_LENGTH.size:AAD_LENGTH.size + length] != aad:
+            raise InvalidTag()
+        return data[AAD_LENGTH.size + length:]
+
+
+SUITES = {suite.name: suite for suite in (AesGcmSuite, ChaChaSuite, FernetSuite)}
+
+
+# ---------------- Suite Selection ----------------
+def benchmark_suites(rounds=BENCH_ROUNDS):
+    """{suite name: seconds for rounds seal+open of a typical payload} on this CPU"""
+    payload = os.urandom(BENCH_PAYLOAD_SIZE)
+    aad = b"0123456789abcdef0123456789abcdef"
+    prefix = b"\x00"
+    timings = {}
+    for name, suite_class in SUITES.items():
+        suite = suite_class(os.urandom(32))
+        suite.open(memoryview(suite.seal(prefix, payload, aad))[1:], aad)   # warm up
+        start = time.perf_counter()
+        for _ in range(rounds):
+            suite.open(memoryview(suite.seal(prefix, payload, aad))[1:], aad)
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+_fastest = None
+
+
+def fastest_suite():
+    """Name of the fastest suite here; benchmarked once per process"""
+    global _fastest
+    if _fastest is None:
+        timings = benchmark_suites()
+        _fastest = min(timings, key=timings.get)
+    return _fastest
+
+
+def write_suite():
+    """Suite for new envelopes, chosen by $SECURE_VAULT_CIPHER"""
+    name = os.environ.get(CIPHER_ENV, DEFAULT_SUITE)
+    if name == AUTO:
+        return fastest_suite()
+    if name not in SUITES:
+        raise ValueError(f"Unknown cipher suite: {name}")
+    return name
+
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else BENCH_ROUNDS * 20
+    results = benchmark_suites(rounds)
+    for name, seconds in sorted(results.items(), key=lambda item: item[1]):
+        print(f"{name:<18} {seconds / rounds * 1e6:7.2f} us per seal+open")
+    print(f"fastest: {min(results, key=results.get)}")
@@ -0,0 +1,158 @@
+# credential_record.py - IN-MEMORY CREDENTIAL RECORDS
+import string
+import time
+import uuid
+
+
+def password_strength(password):
+    """Strong or Weak (no Medium): 8+ characters and 4 of upper/lower/digit/symbol/12+ length"""
+    if len(password) < 8:
+        return "Weak"
+
+    score = 0
+    if any(c.isupper() for c in password):
+        score += 1
+    if any(c.islower() for c in password):
+        score += 1
+    if any(c.isdigit() for c in password):
+        score += 1
+    if any(c in string.punctuation for c in password):
+        score += 1
+    if len(password) >= 12:
+        score += 1
+
+    return "Strong" if score >= 4 else "Weak"
+
+
+def search_credentials(credentials, term):
+    """Credentials whose service or username contains term, ignoring case"""
+    term = term.lower()
+    return [cred for cred in credentials
+            if term in cred.service.lower() or term in cred.username.lower()]
+
+
+class Credential:
+    """
+    One decrypted credential. Slotted to keep per-entry memory small at
+    large vault sizes; screens pass references to these objects around.
+
+    The password is not kept in plaintext until it is read: the first read
+    calls decrypt(password_token) and memoises the plaintext for
+    MEMO_SECONDS, after which it is dropped and the next read decrypts
+    again. Assigning credential.password (add/edit dialogs) stores a plain
+    value until the credential is saved (saved_as).
+    """
+
+    __slots__ = ("id", "service", "username", "category", "strength", "created",
+                 "dirty", "password_token", "decrypt", "_password", "memo_time")
+
+    MEMO_SECONDS = 30
+
+    def __init__(self, service, username, password=None, category="General", strength="Medium",
+                 created=None, id=None, password_token=None, decrypt=None):
+        self.id = id or uuid.uuid4().hex
+        self.service = service
+        self.username = username
+        self.category = category
+        self.strength = strength
+        self.created = created
+        self.dirty = password_token is None   # new credentials must be written
+        self.password_token = password_token  # stored record holding the password
+        self.decrypt = decrypt
+        self._password = password
+        self.memo_time = None               # None: _password is a plain value
+
+    # ---------------- Password ----------------
+    @property
+    def password(self):
+        if self._password is not None:
+            if self.memo_time is None or time.monotonic() - self.memo_time <= self.MEMO_SECONDS:
+                return self._password
+        self._password = self.decrypt(self.password_token)
+        self.memo_time = time.monotonic()
+        return self._password
+
+    @password.setter
+    def password(self, value):
+        self._password = value
+        self.memo_time = None
+
+    def saved_as(self, record, decrypt):
+        """The stored record now holds the password: keep the plaintext only as an expiring memo"""
+        self.password_token = record
+        self.decrypt = decrypt
+        if self._password is not None:
+            self.memo_time = time.monotonic()
+
+    def forget_password(self):
+        """Drop a memoised plaintext now instead of waiting for expiry"""
+        if self.memo_time is not None:
+            self._password = None
+
+    # ---------------- JSON Schema ----------------
+    @classmethod
+    def from_record(cls, record, fields, encryption):
+        """Build from a stored vault record and its opened (password-less) fields"""
+        return cls(fields['service'], fields['username'],
+                   category=fields.get('category', 'General'),
+                   strength=fields.get('strength', 'Medium'),
+                   id=record['id'],
+                   password_token=record,
+                   decrypt=encryption.record_password)
+
+    def fields(self):
+        """Plaintext fields sealed into the envelope (a snapshot, safe to hand to another thread)"""
+        return {
+            'service': self.service,
+            'username': self.username,
+            'password': self.password,
+            'category': self.category,
+            'strength': self.strength
+        }
+
+    @staticmethod
+    def seal(cred_id, fields, encryption):
+        """Stored vault record: the id, one envelope sealing every field and the blind index"""
+        record = {'id': cred_id, 'envelope': encryption.encrypt_record(fields, cred_id)}
+        record['index'] = encryption.index_record(record, fields)
+        return record
+
+    def to_record(self, encryption):
+        return self.seal(self.id, self.fields(), encryption)
+
+
+class CredentialIndex:
+    """
+    Ordered collection of one user's credentials keyed by their stable id.
+    Iterates like the old list (display order = insertion order) while
+    lookups and deletes by id are O(1) and never confuse two identical
+    entries.
+    """
+
+    def __init__(self, credentials=()):
+        self.by_id = {}
+        for credential in credentials:
+            self.add(credential)
+
+    def add(self, credential):
+        """Add or replace a credential"""
+        self.by_id[credential.id] = credential
+
+    def get(self, cred_id):
+        return self.by_id.get(cred_id)
+
+    def remove(self, cred_id):
+        return self.by_id.pop(cred_id, None)
+
+    def copy(self):
+        """Plain list snapshot, e.g. for filtered views"""
+        return list(self.by_id.values())
+
+    def __iter__(self):
+        return iter(self.by_id.values())
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def __contains__(self, cred_id):
+        return cred_id in self.by_id
@@ -0,0 +1,163 @@
+# durable_io.py - CRASH-SAFE ATOMIC WRITES WITH GROUP COMMIT
+"""
+Every store file is replaced atomically: the new content goes to a
+temporary file next to the target, is fsynced, renamed over the target and
+the directory entry is fsynced. A crash leaves either the old or the new
+file, never a truncated one.
+
+JSON stores that are saved in quick succession (users, settings, audit
+log) go through group commit: update_json() only queues the change and one
+physical write per file happens after GROUP_COMMIT_WINDOW seconds, however
+many changes were queued. load_json() applies queued changes, so readers
+never observe the older file. flush_pending() writes everything
+queued now; the app calls it on logout and exit (and atexit as a backstop).
+A write that fails stays queued and is retried by the next flush;
+flush_pending() raises the error to its caller.
+"""
+import atexit
+import copy
+import json
+import os
+import threading
+from file_locks import exclusive_lock, shared_lock
+from store_cache import store_cache
+
+GROUP_COMMIT_WINDOW = 0.2   # seconds a save may wait for later saves to join it
+
+
+# ---------------- Atomic Writes ----------------
+def fsync_directory(path):
+    """Persist a rename in the directory containing path (no-op where unsupported)"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, data):
+    """Replace path with data (bytes): temp file, fsync, rename"""
+    tmp_file = path + ".tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, path)
+    fsync_directory(path)
+
+
+def atomic_write_json(path, data, indent=4):
+    atomic_write(path, json.dumps(data, indent=indent).encode())
+
+
+# ---------------- Group Commit ----------------
+class GroupCommitWriter:
+    """
+    Coalesces updates of the same JSON file within a short window into one
+    atomic write. Updates are queued as functions (document -> document)
+    rather than whole documents: the flush re-reads the file under its
+    exclusive lock and replays them, so a save made by another app instance
+    in the meantime is merged instead of overwritten.
+    """
+
+    def __init__(self, window=GROUP_COMMIT_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()          # guards pending / timer
+        self.flush_lock = threading.Lock()    # held while files are being written
+        self.pending = {}                     # path -> (default, indent, [update, ...])
+        self.timer = None
+        self.saves = 0
+        self.writes = 0
+
+    def update(self, path, apply, default, indent=4):
+        """Queue apply(document) for path; default is used if the file does not exist"""
+        with self.lock:
+            self.pending.setdefault(path, (default, indent, []))[2].append(apply)
+            self.saves += 1
+            if self.timer is None:
+                self.timer = threading.Timer(self.window, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def load(self, path, default):
+        """Document on disk with the updates still queued for it applied"""
+        # Waiting for a running flush keeps its updates from being applied twice
+        with self.flush_lock:
+            with shared_lock(path):
+                document = store_cache.get(path, parse_json)
+            with self.lock:
+                updates = list(self.pending.get(path, (None, None, []))[2])
+        if document is None:
+            document = copy.deepcopy(default)
+        elif updates:
+            document = copy.deepcopy(document)   # never edit the cached parse
+        for apply in updates:
+            document = apply(document)
+        return document
+
+    def flush(self, paths=None):
+        """Write every queued file now, or just the given ones"""
+        with self.flush_lock:
+            with self.lock:
+                if paths is None:
+                    if self.timer is not None:
+                        self.timer.cancel()
+                        self.timer = None
+                    batch, self.pending = self.pending, {}
+                else:
+                    # The timer stays armed for the other files
+                    batch = {path: self.pending.pop(path) for path in paths if path in self.pending}
+            written = set()
+            try:
+                for path, (default, indent, updates) in batch.items():
+                    with exclusive_lock(path):
+                        document = read_json(path, default)
+                        for apply in updates:
+                            document = apply(document)
+                        atomic_write_json(path, document, indent)
+                    written.add(path)
+                    self.writes += 1
+            except BaseException:
+                # Disk full, I/O error: requeue what was not written, ahead of
+                # updates queued since, so the next flush retries it
+                with self.lock:
+                    for path, (default, indent, updates) in batch.items():
+                        if path not in written:
+                            newer = self.pending.pop(path, (default, indent, []))[2]
+                            self.pending[path] = (default, indent, updates + newer)
+                raise
+
+
+def parse_json(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def read_json(path, default):
+    if not os.path.exists(path):
+        return copy.deepcopy(default)
+    return parse_json(path)
+
+
+group_commit = GroupCommitWriter()
+atexit.register(group_commit.flush)
+
+
+def update_json(path, apply, default=None, indent=4):
+    """Queue a group-committed, merged update of a JSON document (see GroupCommitWriter)"""
+    group_commit.update(path, apply, default, indent)
+
+
+def load_json(path, default=None):
+    """
+    Read a JSON document, including updates that are still queued. The
+    result may be the cached parse shared with other readers: copy it
+    before editing.
+    """
+    return group_commit.load(path, default)
+
+
+def flush_pending(paths=None):
+    group_commit.flush(paths)
@@ -0,0 +1,87 @@
+# file_locks.py - ADVISORY INTER-PROCESS FILE LOCKS
+"""
+Shared/exclusive locks between app instances working on the same data
+directory. Each protected file gets a "<file>.lock" sidecar that is locked
+with fcntl.flock: the data file itself cannot carry the lock because it is
+replaced by rename on every write.
+
+    with shared_lock("users.json"):      # readers
+        ...
+    with exclusive_lock("users.json"):   # read-modify-write cycles
+        ...
+
+Locks are re-entrant within a thread (an exclusive holder may take the
+shared lock again) and also serialize the threads of one process. Where
+fcntl is unavailable (Windows) only the in-process part applies.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+    LOCK_SH, LOCK_EX, LOCK_UN = fcntl.LOCK_SH, fcntl.LOCK_EX, fcntl.LOCK_UN
+except ImportError:
+    fcntl = None
+    LOCK_SH = LOCK_EX = LOCK_UN = None
+
+
+class FileLock:
+    """flock on a sidecar file, re-entrant per thread"""
+
+    def __init__(self, path):
+        self.lock_path = path + ".lock"
+        self.thread_lock = threading.RLock()
+        self.fd = None
+        self.depth = 0
+        self.exclusive = False
+
+    @contextmanager
+    def acquire(self, exclusive):
+        with self.thread_lock:
+            upgraded = False
+            if self.depth == 0:
+                self.fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+                self.flock(LOCK_EX if exclusive else LOCK_SH)
+                self.exclusive = exclusive
+            elif exclusive and not self.exclusive:
+                # flock upgrades are not atomic; callers take the exclusive lock outermost
+                self.flock(LOCK_EX)
+                self.exclusive = upgraded = True
+            self.depth += 1
+            try:
+                yield
+            finally:
+                self.depth -= 1
+                if upgraded:
+                    self.flock(LOCK_SH)
+                    self.exclusive = False
+                if self.depth == 0:
+                    self.flock(LOCK_UN)
+                    os.close(self.fd)
+                    self.fd = None
+
+    def flock(self, operation):
+        if fcntl is not None:
+            fcntl.flock(self.fd, operation)
+
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def file_lock(path):
+    """The process-wide FileLock for path"""
+    key = os.path.abspath(path)
+    with _locks_guard:
+        if key not in _locks:
+            _locks[key] = FileLock(path)
+        return _locks[key]
+
+
+def shared_lock(path):
+    return file_lock(path).acquire(exclusive=False)
+
+
+def exclusive_lock(path):
+    return file_lock(path).acquire(exclusive=True)
@@ -0,0 +1,174 @@
+# key_rotation.py - ONLINE INSTALLATION KEY ROTATION
+"""
+Replaces the installation key in vault_key.key without a blocking rewrite
+of the vault:
+
+    start   a new key is put first in the keyring. From then on every new
+            seal uses it, and reads try each key in the ring (MultiFernet
+            for legacy tokens, one AES-GCM cipher per key for envelopes).
+            Other instances pick up the rewritten key file on their next
+            seal or on a failed open.
+    step    re-seals one batch of BATCH_SIZE records under the new key and
+            saves the cursor (pass, user, position) in key_rotation.json,
+            so an interrupted rotation continues where it stopped. Records
+            already under the new key, or sealed with a user's own key, are
+            only checked, not rewritten.
+    finish  once a whole pass over every user re-sealed nothing, the old
+            keys move from the key file to vault_key.retired.
+
+The final pass is what makes positional cursors safe: a delete during a
+pass shifts later records down and may hide one from the cursor, and
+another instance may seal under the old key just before it notices the
+new one. Whatever a pass misses, the next one catches. Each pass also
+re-wraps the users' key recovery wraps, where key recovery is on (see
+vault_keys).
+
+The app runs step() on the persistence worker one batch per job, so user
+saves interleave with the rotation and the UI stays responsive. A running
+app checks every few seconds for a rotation started elsewhere, and for a
+rewritten key file. When it finds one, it reloads the logged-in user's
+stored records, so a rotation finished by "run" does not leave the
+session holding records sealed under retired keys.
+
+Retired keys are only read to restore backups exported before a rotation
+(see vault_backup); no instance keeps them in its keyring. Deleting
+vault_key.retired makes those backups unrestorable, which is the way to
+get rid of a compromised key for good.
+
+    python key_rotation.py start    begin; the app re-encrypts in the background
+    python key_rotation.py run      begin if needed and re-encrypt everything now
+    python key_rotation.py status
+"""
+import json
+import os
+import sys
+import time
+from durable_io import atomic_write_json, flush_pending
+from file_locks import exclusive_lock
+from vault_keys import rewrap_recovery
+
+ROTATION_FILE = "key_rotation.json"
+BATCH_SIZE = 500
+
+
+class KeyRotation:
+    """Resumable re-encryption of the vault under a new installation key"""
+
+    def __init__(self, encryption, vault_store, users_store, state_file=ROTATION_FILE,
+                 batch_size=BATCH_SIZE):
+        self.encryption = encryption
+        self.vault_store = vault_store
+        self.users_store = users_store
+        self.state_file = state_file
+        self.batch_size = batch_size
+
+    # ---------------- State ----------------
+    def load_state(self):
+        if not os.path.exists(self.state_file):
+            return None
+        with open(self.state_file, "r") as f:
+            return json.load(f)
+
+    def save_state(self, state):
+        atomic_write_json(self.state_file, state)
+
+    def in_progress(self):
+        return os.path.exists(self.state_file)
+
+    # ---------------- Rotation ----------------
+    def start(self):
+        """Make a new key current and begin the first pass (no-op while a rotation runs)"""
+        with exclusive_lock(self.state_file):
+            if self.in_progress():
+                return self.load_state()
+            self.encryption.add_key()
+            state = {"pass": 0, "scanned": 0, "rotated": 0, "seconds": 0.0}
+            self.begin_pass(state)
+            self.save_state(state)
+            return state
+
+    def begin_pass(self, state):
+        state.update({"pass": state["pass"] + 1, "users": self.vault_store.users(),
+                      "user": 0, "position": 0, "pass_rotated": 0})
+        ciphers = self.encryption.recovery_ciphers()
+        for username, user_data in self.users_store.all().items():
+            if rewrap_recovery(username, user_data, ciphers):
+                self.users_store.put(username, user_data)
+        flush_pending()
+
+    def step(self):
+        """Re-seal one batch; returns False when there is nothing left to do"""
+        with exclusive_lock(self.state_file):
+            state = self.load_state()
+            if state is None:
+                return False
+            start_time = time.perf_counter()
+
+            if state["user"] >= len(state["users"]):
+                if state["pass_rotated"] == 0:
+                    self.finish()
+                    return False
+                self.begin_pass(state)
+            else:
+                user = state["users"][state["user"]]
+                records = self.vault_store.page_user_records(user, state["position"], self.batch_size)
+                rotated = [record for record in self.encryption.map_batch(self.encryption.rotate_record, records)
+                           if record is not None]
+                if rotated:
+                    self.vault_store.put_many(user, rotated)
+
+                state["scanned"] += len(records)
+                state["rotated"] += len(rotated)
+                state["pass_rotated"] += len(rotated)
+                if len(records) < self.batch_size:
+                    state["user"] += 1
+                    state["position"] = 0
+                else:
+                    state["position"] += len(records)
+
+            state["seconds"] += time.perf_counter() - start_time
+            self.save_state(state)
+            return True
+
+    def finish(self):
+        self.encryption.retire_keys()
+        os.remove(self.state_file)
+
+    def run(self, progress=None):
+        """Start if needed and rotate everything now; returns the final state"""
+        self.start()
+        state = self.load_state()
+        while self.step():
+            state = self.load_state() or state
+            if progress is not None:
+                progress(state)
+        return state
+
+
+def summary(state):
+    rate = state["scanned"] / state["seconds"] if state["seconds"] else 0.0
+    return (f"pass {state['pass']}: {state['scanned']} records checked, {state['rotated']} re-sealed "
+            f"in {state['seconds']:.2f}s ({rate:.0f} records/s)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in ("start", "run", "status"):
+        print("usage: python key_rotation.py start|run|status")
+        sys.exit(1)
+    from encryption import EncryptionManager
+    from storage import get_repository
+
+    repository = get_repository()
+    repository.initialize()
+    manager = EncryptionManager()
+    rotation = KeyRotation(manager, repository.vault, repository.users)
+    if sys.argv[1] == "start":
+        print(summary(rotation.start()))
+    elif sys.argv[1] == "run":
+        print(summary(rotation.run(progress=lambda s: print(f"  {summary(s)}"))))
+    else:
+        current = rotation.load_state()
+        print(summary(current) if current else "no rotation in progress")
+    repository.close()
+    flush_pending()
+    manager.shutdown()
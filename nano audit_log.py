@@ -2,11 +2,11 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
-import json
-import os
 import socket
 import random
 import subprocess
+from storage import get_repository
+from durable_io import load_json, update_json
 
 class AuditLog:
     LOG_FILE = "audit_logs.json"
@@ -39,8 +39,8 @@ class AuditLog:
         return f"203.45.67.{random.randint(85, 99)}"
     
     @staticmethod
-    def log_event(event_type, severity, description, user, ip_address=None):
-        """Log an audit event in real-time"""
+    def new_event(event_type, severity, description, user, ip_address=None):
+        """Audit entry for an event, not written yet (see append_entry)"""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
         if not ip_address:
@@ -49,7 +49,7 @@ class AuditLog:
             else:
                 ip_address = AuditLog.get_real_ip()
         
-        log_entry = {
+        return {
             "timestamp": timestamp,
             "event_type": event_type,
             "severity": severity,
@@ -57,34 +57,39 @@ class AuditLog:
             "user": user,
             "ip_address": ip_address
         }
+    
+    @staticmethod
+    def append_entry(log_entry, once=False):
+        """Queue an entry for the log file; once=True skips it if the log already holds it (replays)"""
+        event_type = log_entry["event_type"]
+        user = log_entry["user"]
+        
+        def apply(logs):
+            if once and log_entry in logs:
+                return logs
+            
+            # Check for duplicate logs (prevent multiple weak password warnings)
+            if event_type == "WEAK_PASSWORD_DETECTED":
+                # Remove any existing weak password logs for same user
+                logs = [log for log in logs if not (log.get('event_type') == "WEAK_PASSWORD_DETECTED" and 
+                                                   log.get('user') == user and
+                                                   "Weak Passwords Detected" in log.get('description', ''))]
+            
+            # Add new log
+            logs.append(log_entry)
+            
+            # Keep only last 200 entries
+            return logs[-200:]
         
-        # Load existing logs
-        logs = []
-        if os.path.exists(AuditLog.LOG_FILE):
-            try:
-                with open(AuditLog.LOG_FILE, "r") as f:
-                    logs = json.load(f)
-            except:
-                logs = []
-        
-        # Check for duplicate logs (prevent multiple weak password warnings)
-        if event_type == "WEAK_PASSWORD_DETECTED":
-            # Remove any existing weak password logs for same user
-            logs = [log for log in logs if not (log.get('event_type') == "WEAK_PASSWORD_DETECTED" and 
-                                               log.get('user') == user and
-                                               "Weak Passwords Detected" in log.get('description', ''))]
-        
-        # Add new log
-        logs.append(log_entry)
-        
-        # Keep only last 200 entries
-        if len(logs) > 200:
-            logs = logs[-200:]
-        
-        # Save to file
-        with open(AuditLog.LOG_FILE, "w") as f:
-            json.dump(logs, f, indent=2)
-        
+        # Save to file (atomic, coalesced with other saves in the same window and
+        # applied to the file as it is then, so other app instances' events survive)
+        update_json(AuditLog.LOG_FILE, apply, [], indent=2)
+    
+    @staticmethod
+    def log_event(event_type, severity, description, user, ip_address=None):
+        """Log an audit event in real-time"""
+        log_entry = AuditLog.new_event(event_type, severity, description, user, ip_address)
+        AuditLog.append_entry(log_entry)
         return log_entry
     
     @staticmethod
@@ -110,8 +115,8 @@ class AuditLog:
         )
     
     @staticmethod
-    def log_password_operation(operation, service_name, details, user_email):
-        """Log password operations"""
+    def password_operation_event(operation, service_name, details, user_email):
+        """Audit entry for a password operation, written together with the vault change"""
         severity_map = {
             "added": "INFO",
             "viewed": "WARNING",
@@ -128,17 +133,24 @@ class AuditLog:
         
         description = f"Service: {service_name} | Action: {action_text.get(operation, details)}"
         
-        return AuditLog.log_event(
+        return AuditLog.new_event(
             event_type=f"PASSWORD_{operation.upper()}",
             severity=severity_map.get(operation, "INFO"),
             description=description,
             user=user_email
         )
     
+    @staticmethod
+    def log_password_operation(operation, service_name, details, user_email):
+        """Log password operations"""
+        log_entry = AuditLog.password_operation_event(operation, service_name, details, user_email)
+        AuditLog.append_entry(log_entry)
+        return log_entry
+    
     @staticmethod
     def check_weak_passwords(credentials, user_email):
         """Check for weak passwords and log them ONCE only"""
-        weak_creds = [cred for cred in credentials if cred.get('strength') == 'Weak']
+        weak_creds = [cred for cred in credentials if cred.strength == 'Weak']
         weak_count = len(weak_creds)
         
         if weak_count > 0:
@@ -148,7 +160,7 @@ class AuditLog:
                                log.get('event_type') == "WEAK_PASSWORD_DETECTED"]
             
             if not recent_weak_logs:  # Only log if no recent weak password logs
-                weak_services = [cred['service'] for cred in weak_creds[:3]]
+                weak_services = [cred.service for cred in weak_creds[:3]]
                 service_list = ', '.join(weak_services)
                 if len(weak_creds) > 3:
                     service_list += f" and {len(weak_creds) - 3} more"
@@ -175,12 +187,8 @@ class AuditLog:
     @staticmethod
     def get_logs_for_user(user_email, limit=100):
         """Get audit logs for a specific user"""
-        if not os.path.exists(AuditLog.LOG_FILE):
-            return []
-        
         try:
-            with open(AuditLog.LOG_FILE, "r") as f:
-                all_logs = json.load(f)
+            all_logs = load_json(AuditLog.LOG_FILE, [])
         except:
             return []
         
@@ -218,15 +226,12 @@ class AuditLog:
     
     def get_user_email(self):
         """Get user's email address"""
-        users_file = "users.json"
-        if os.path.exists(users_file):
-            try:
-                with open(users_file, "r") as f:
-                    users = json.load(f)
-                    if self.username in users:
-                        return users[self.username]['email']
-            except:
-                pass
+        try:
+            user = get_repository().users.get(self.username)
+            if user is not None:
+                return user['email']
+        except:
+            pass
         return self.username
     
     def show_audit_screen(self):
@@ -1,19 +1,25 @@
 # credential_management.py - WITH HEADER BOX AND FULLY EXTENDED CARDS
+import os
 import tkinter as tk
-from tkinter import messagebox
+from tkinter import filedialog, messagebox
 from datetime import datetime
-import string
-import os
-import json
 from audit_log import AuditLog
+from storage import get_repository
+from credential_record import Credential, CredentialIndex, password_strength
+from persistence import get_persistence
+from vault_import import import_credentials
+from vault_backup import export_vault, restore_vault
 
 class CredentialManager:
-    def __init__(self, root, current_user, update_callback, encryption, dashboard_callback):
+    def __init__(self, root, current_user, update_callback, encryption, dashboard_callback,
+                 reload_callback=None):
         self.root = root
         self.current_user = current_user
         self.update_callback = update_callback
         self.encryption = encryption
         self.dashboard_callback = dashboard_callback
+        # Dashboard with the vault decrypted afresh (after import/restore)
+        self.reload_callback = reload_callback or dashboard_callback
 
         self.data = {"users": {}}
 
@@ -83,6 +89,47 @@ class CredentialManager:
             command=self.add_credential_dialog
         ).pack(side="right", padx=10)
 
+        # Backup / Restore Buttons
+        tk.Button(
+            header,
+            text="♻ Restore",
+            bg="#e2e8f0",
+            fg="#1e293b",
+            font=("Arial", 11, "bold"),
+            cursor="hand2",
+            bd=0,
+            padx=20,
+            pady=8,
+            command=self.restore_backup_dialog
+        ).pack(side="right", padx=10)
+
+        tk.Button(
+            header,
+            text="💾 Backup",
+            bg="#e2e8f0",
+            fg="#1e293b",
+            font=("Arial", 11, "bold"),
+            cursor="hand2",
+            bd=0,
+            padx=20,
+            pady=8,
+            command=self.export_backup_dialog
+        ).pack(side="right", padx=10)
+
+        # Import Button
+        tk.Button(
+            header,
+            text="📥 Import",
+            bg="#e2e8f0",
+            fg="#1e293b",
+            font=("Arial", 11, "bold"),
+            cursor="hand2",
+            bd=0,
+            padx=20,
+            pady=8,
+            command=self.import_credentials_dialog
+        ).pack(side="right", padx=10)
+
         # Container for credentials list
         container = tk.Frame(self.root, bg="#f0f2f5")
         container.pack(fill="both", expand=True, padx=10, pady=10)
@@ -129,13 +176,13 @@ class CredentialManager:
         info = tk.Frame(card, bg="white")
         info.pack(side="left", expand=True, fill="both", padx=20)
 
-        tk.Label(info, text=credential["service"], font=("Arial", 15, "bold"),
+        tk.Label(info, text=credential.service, font=("Arial", 15, "bold"),
                  bg="white", fg="#1e293b", anchor='w').pack(fill='x')
-        tk.Label(info, text=credential["username"], font=("Arial", 12),
+        tk.Label(info, text=credential.username, font=("Arial", 12),
                  bg="white", fg="#64748b", anchor='w').pack(fill='x', pady=(3, 0))
 
         # Strength badge (Strong or Weak only)
-        strength = credential.get("strength", "Weak")
+        strength = credential.strength
         strength_color = "#10b981" if strength == "Strong" else "#ef4444"
         strength_icon = "✅" if strength == "Strong" else "⚠️"
         
@@ -148,15 +195,15 @@ class CredentialManager:
         # Action buttons
         tk.Button(card, text="👁 View", bd=0, font=("Arial", 11, "bold"),
                   bg="#dbeafe", fg="#2563eb", padx=14, pady=7,
-                  command=lambda c=credential: self.view_credential(c)).pack(side="right", padx=8)
+                  command=lambda i=credential.id: self.view_credential(i)).pack(side="right", padx=8)
 
         tk.Button(card, text="✏️ Edit", bg="#fef3c7", fg="#d97706", bd=0,
                   font=("Arial", 11, "bold"), padx=14, pady=7,
-                  command=lambda c=credential: self.edit_credential(c)).pack(side="right", padx=8)
+                  command=lambda i=credential.id: self.edit_credential(i)).pack(side="right", padx=8)
 
         tk.Button(card, text="🗑️ Delete", bg="#fee2e2", fg="#dc2626", bd=0,
                   font=("Arial", 11, "bold"), padx=14, pady=7,
-                  command=lambda c=credential: self.delete_credential(c)).pack(side="right", padx=8)
+                  command=lambda i=credential.id: self.delete_credential(i)).pack(side="right", padx=8)
 
     # ---------------- Add ----------------
     def add_credential_dialog(self):
@@ -222,30 +269,24 @@ class CredentialManager:
                 messagebox.showerror("Error", "All fields are required!")
                 return
             
-            cred = {
-                "service": service_name,
-                "username": username,
-                "password": pwd,
-                "strength": self.calculate_password_strength(pwd),
-                "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
+            cred = Credential(
+                service_name,
+                username,
+                pwd,
+                strength=self.calculate_password_strength(pwd),
+                created=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            )
 
-            self.data["users"].setdefault(self.current_user, {"credentials": []})
-            self.data["users"][self.current_user]["credentials"].append(cred)
+            self.data["users"].setdefault(self.current_user, {"credentials": CredentialIndex()})
+            self.data["users"][self.current_user]["credentials"].add(cred)
 
             # Get user email for audit log
-            users_file = "users.json"
-            user_email = self.current_user
-            if os.path.exists(users_file):
-                with open(users_file, "r") as f:
-                    users = json.load(f)
-                    if self.current_user in users:
-                        user_email = users[self.current_user]['email']
+            user_email = self.get_user_email()
             
-            # LOG PASSWORD ADDED
-            AuditLog.log_password_operation("added", service_name, "Created new password entry", user_email)
+            # LOG PASSWORD ADDED (saved together with the credential)
+            event = AuditLog.password_operation_event("added", service_name, "Created new password entry", user_email)
 
-            self.update_callback(self.data["users"][self.current_user]["credentials"])
+            self.update_callback(self.data["users"][self.current_user]["credentials"], [event])
             dialog.destroy()
             self.show_credentials()
             
@@ -262,25 +303,109 @@ class CredentialManager:
                  font=("Arial", 11, "bold"), padx=25, pady=8,
                  command=save).pack(side="left", padx=10)
 
+    # ---------------- Import ----------------
+    def import_credentials_dialog(self):
+        path = filedialog.askopenfilename(
+            title="Import credentials",
+            filetypes=[("Password exports", "*.csv *.json *.jsonl"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+
+        # Pending edits first, so the import lands after them
+        if self.current_user in self.data["users"]:
+            self.update_callback(self.data["users"][self.current_user]["credentials"])
+
+        user = self.current_user
+        get_persistence().submit(
+            import_credentials, path, user, get_repository().vault, self.encryption,
+            on_done=lambda result: self.import_finished(path, result),
+            on_error=lambda error: messagebox.showerror(
+                "Import Failed", f"Could not import {os.path.basename(path)}:\n{error}")
+        )
+        messagebox.showinfo("Import", f"Importing {os.path.basename(path)} in the background...")
+
+    def import_finished(self, path, result):
+        # One summary event for the whole file instead of one per credential
+        AuditLog.log_event(
+            event_type="CREDENTIALS_IMPORTED",
+            severity="INFO",
+            description=f"Imported {result.imported} credentials from {os.path.basename(path)} "
+                        f"({result.skipped} skipped, {result.rate:.0f}/s)",
+            user=self.get_user_email()
+        )
+        messagebox.showinfo("Import Complete", result.summary())
+        # Back to the dashboard, reloading the vault with the new entries
+        self.reload_callback()
+
+    # ---------------- Backup & Restore ----------------
+    def export_backup_dialog(self):
+        path = filedialog.asksaveasfilename(
+            title="Save encrypted backup",
+            defaultextension=".bak",
+            filetypes=[("Secure Vault backup", "*.bak")]
+        )
+        if not path:
+            return
+
+        if self.current_user in self.data["users"]:
+            self.update_callback(self.data["users"][self.current_user]["credentials"])
+
+        get_persistence().submit(
+            export_vault, path, get_repository().vault, self.encryption, [self.current_user],
+            on_done=lambda result: self.backup_finished("BACKUP_EXPORTED", "Backup Saved", path, result),
+            on_error=lambda error: messagebox.showerror("Backup Failed", str(error))
+        )
+
+    def restore_backup_dialog(self):
+        path = filedialog.askopenfilename(
+            title="Restore encrypted backup",
+            filetypes=[("Secure Vault backup", "*.bak"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+
+        if self.current_user in self.data["users"]:
+            self.update_callback(self.data["users"][self.current_user]["credentials"])
+
+        # Restored records go to the current user; an interrupted restore continues
+        get_persistence().submit(
+            restore_vault, path, get_repository().vault, self.encryption, self.current_user, True,
+            on_done=lambda result: self.backup_finished("BACKUP_RESTORED", "Restore Complete", path, result),
+            on_error=lambda error: messagebox.showerror("Restore Failed", str(error))
+        )
+
+    def backup_finished(self, event_type, title, path, result):
+        AuditLog.log_event(
+            event_type=event_type,
+            severity="INFO",
+            description=f"{os.path.basename(path)}: {result.records} records"
+                        + (f", {result.skipped} skipped" if result.skipped else ""),
+            user=self.get_user_email()
+        )
+        messagebox.showinfo(title, result.summary())
+        if event_type == "BACKUP_RESTORED":
+            # Back to the dashboard, reloading the vault with the restored records
+            self.reload_callback()
+
     # ---------------- View ----------------
-    def view_credential(self, credential):
+    def view_credential(self, cred_id):
+        credential = self.get_credential(cred_id)
+        if credential is None:
+            return
+
         # Get user email for audit log
-        users_file = "users.json"
-        user_email = self.current_user
-        if os.path.exists(users_file):
-            with open(users_file, "r") as f:
-                users = json.load(f)
-                if self.current_user in users:
-                    user_email = users[self.current_user]['email']
+        user_email = self.get_user_email()
         
         # LOG PASSWORD VIEWED
-        AuditLog.log_password_operation("viewed", credential['service'], "Password revealed and copied", user_email)
+        AuditLog.log_password_operation("viewed", credential.service, "Password revealed and copied", user_email)
         
         # Create custom dialog
         dialog = tk.Toplevel(self.root)
         dialog.title("View Credential")
         dialog.geometry("600x450")
         dialog.grab_set()
+        self.forget_password_on_close(dialog, credential)
         dialog.configure(bg="#f8fafc")
         
         tk.Label(dialog, text="🔐 Credential Details", font=("Arial", 20, "bold"),
@@ -294,7 +419,7 @@ class CredentialManager:
         service_frame.pack(fill="x", pady=18)
         tk.Label(service_frame, text="Service:", font=("Arial", 13, "bold"),
                 bg="white", fg="#475569", width=14, anchor="w").pack(side="left")
-        tk.Label(service_frame, text=credential['service'], font=("Arial", 13),
+        tk.Label(service_frame, text=credential.service, font=("Arial", 13),
                 bg="white", fg="#1e293b").pack(side="left", padx=10)
         
         # Username
@@ -302,7 +427,7 @@ class CredentialManager:
         user_frame.pack(fill="x", pady=18)
         tk.Label(user_frame, text="Username:", font=("Arial", 13, "bold"),
                 bg="white", fg="#475569", width=14, anchor="w").pack(side="left")
-        tk.Label(user_frame, text=credential['username'], font=("Arial", 13),
+        tk.Label(user_frame, text=credential.username, font=("Arial", 13),
                 bg="white", fg="#1e293b").pack(side="left", padx=10)
         
         # Password
@@ -317,12 +442,13 @@ class CredentialManager:
         pass_label.pack(side="left", padx=10)
         
         def show_password():
-            password_var.set(credential['password'])
+            password_var.set(credential.password)
             show_btn.config(text="👁 Hide", command=hide_password)
         
         def hide_password():
             password_var.set("•" * 12)
             show_btn.config(text="👁 Show", command=show_password)
+            credential.forget_password()
         
         show_btn = tk.Button(pass_frame, text="👁 Show", font=("Arial", 11, "bold"),
                            bg="#dbeafe", fg="#2563eb", bd=0, padx=15, pady=5,
@@ -335,7 +461,7 @@ class CredentialManager:
         tk.Label(strength_frame, text="Strength:", font=("Arial", 13, "bold"),
                 bg="white", fg="#475569", width=14, anchor="w").pack(side="left")
         
-        strength = credential['strength']
+        strength = credential.strength
         strength_color = "#10b981" if strength == "Strong" else "#ef4444"
         tk.Label(strength_frame, text=strength, font=("Arial", 13, "bold"),
                 fg="white", bg=strength_color, padx=15, pady=4).pack(side="left", padx=10)
@@ -346,11 +472,16 @@ class CredentialManager:
                  command=dialog.destroy).pack(pady=25)
 
     # ---------------- Edit ----------------
-    def edit_credential(self, credential):
+    def edit_credential(self, cred_id):
+        credential = self.get_credential(cred_id)
+        if credential is None:
+            return
+
         dialog = tk.Toplevel(self.root)
         dialog.title("Edit Credential")
         dialog.geometry("550x520")
         dialog.grab_set()
+        self.forget_password_on_close(dialog, credential)
         dialog.configure(bg="#f8fafc")
 
         tk.Label(dialog, text="Edit Credential", font=("Arial", 18, "bold"),
@@ -369,7 +500,7 @@ class CredentialManager:
             
             e = tk.Entry(frame, font=("Arial", 12), width=40,
                         bg="white", fg="#1e293b", relief="solid", bd=1)
-            e.insert(0, credential[key])
+            e.insert(0, getattr(credential, key))
             if key == "password":
                 e.config(show="•")
             e.pack(fill="x")
@@ -380,7 +511,7 @@ class CredentialManager:
         strength_frame.pack(fill="x")
         
         self.edit_strength_label = tk.Label(strength_frame, 
-                                           text=f"Current Strength: {credential['strength']}", 
+                                           text=f"Current Strength: {credential.strength}", 
                                            font=("Arial", 11), bg="#f8fafc", fg="#6b7280")
         self.edit_strength_label.pack(anchor="w")
         
@@ -399,26 +530,21 @@ class CredentialManager:
 
         def save():
             for k in fields:
-                credential[k] = fields[k].get()
-            credential["strength"] = self.calculate_password_strength(credential["password"])
+                setattr(credential, k, fields[k].get())
+            credential.strength = self.calculate_password_strength(credential.password)
+            credential.dirty = True
 
             # Get user email for audit log
-            users_file = "users.json"
-            user_email = self.current_user
-            if os.path.exists(users_file):
-                with open(users_file, "r") as f:
-                    users = json.load(f)
-                    if self.current_user in users:
-                        user_email = users[self.current_user]['email']
+            user_email = self.get_user_email()
             
-            # LOG PASSWORD EDITED
-            AuditLog.log_password_operation("edited", credential['service'], "Password updated and modified", user_email)
+            # LOG PASSWORD EDITED (saved together with the credential)
+            event = AuditLog.password_operation_event("edited", credential.service, "Password updated and modified", user_email)
 
-            self.update_callback(self.data["users"][self.current_user]["credentials"])
+            self.update_callback(self.data["users"][self.current_user]["credentials"], [event])
             dialog.destroy()
             self.show_credentials()
             
-            messagebox.showinfo("Success", f"Credential for {credential['service']} updated successfully!")
+            messagebox.showinfo("Success", f"Credential for {credential.service} updated successfully!")
 
         button_frame = tk.Frame(dialog, bg="#f8fafc")
         button_frame.pack(pady=20)
@@ -432,53 +558,51 @@ class CredentialManager:
                  command=save).pack(side="left", padx=10)
 
     # ---------------- Delete ----------------
-    def delete_credential(self, credential):
+    def delete_credential(self, cred_id):
+        credential = self.get_credential(cred_id)
+        if credential is None:
+            return
+
         confirm = messagebox.askyesno(
             "Confirm Delete",
-            f"Are you sure you want to delete the credential for {credential['service']}?\n\nThis action cannot be undone!"
+            f"Are you sure you want to delete the credential for {credential.service}?\n\nThis action cannot be undone!"
         )
         
         if not confirm:
             return
         
         # Get user email for audit log
-        users_file = "users.json"
-        user_email = self.current_user
-        if os.path.exists(users_file):
-            with open(users_file, "r") as f:
-                users = json.load(f)
-                if self.current_user in users:
-                    user_email = users[self.current_user]['email']
-        
-        # LOG PASSWORD DELETED
-        AuditLog.log_password_operation("deleted", credential['service'], "Permanently removed from vault", user_email)
-        
-        self.data["users"][self.current_user]["credentials"].remove(credential)
-        self.update_callback(self.data["users"][self.current_user]["credentials"])
+        user_email = self.get_user_email()
+        
+        # LOG PASSWORD DELETED (saved together with the deletion)
+        event = AuditLog.password_operation_event("deleted", credential.service, "Permanently removed from vault", user_email)
+        
+        self.data["users"][self.current_user]["credentials"].remove(cred_id)
+        self.update_callback(self.data["users"][self.current_user]["credentials"], [event])
         self.show_credentials()
         
-        messagebox.showinfo("Deleted", f"Credential for {credential['service']} has been deleted.")
+        messagebox.showinfo("Deleted", f"Credential for {credential.service} has been deleted.")
 
     # ---------------- Utils ----------------
+    def get_credential(self, cred_id):
+        """O(1) lookup in the current user's id index"""
+        user_data = self.data["users"].get(self.current_user)
+        return user_data["credentials"].get(cred_id) if user_data else None
+
+    def forget_password_on_close(self, dialog, credential):
+        """Drop the credential's decrypted password when the dialog that showed it closes"""
+        def on_destroy(event):
+            if event.widget is dialog:
+                credential.forget_password()
+        dialog.bind("<Destroy>", on_destroy)
+
+    def get_user_email(self):
+        user = get_repository().users.get(self.current_user)
+        return user['email'] if user else self.current_user
+
     def calculate_password_strength(self, password):
         """Calculate password strength: Strong or Weak only (no Medium)"""
-        if len(password) < 8:
-            return "Weak"
-        
-        score = 0
-        if any(c.isupper() for c in password):
-            score += 1
-        if any(c.islower() for c in password):
-            score += 1
-        if any(c.isdigit() for c in password):
-            score += 1
-        if any(c in string.punctuation for c in password):
-            score += 1
-        if len(password) >= 12:
-            score += 1
-        
-        # Strong if score >= 4, otherwise Weak
-        return "Strong" if score >= 4 else "Weak"
+        return password_strength(password)
 
     def strength_color(self, strength):
         colors = {
@@ -2,15 +2,21 @@ import tkinter as tk
 from tkinter import ttk
 import os
 import json
+from itertools import islice
 from audit_log import AuditLog
+from credential_record import search_credentials
 
 class Dashboard:
-    def __init__(self, parent, username, user_data, credentials, on_logout_callback, on_update_stats=None, open_credentials_callback=None):
+    PAGE_SIZE = 100   # credential rows built per "Show more"
+    
+    def __init__(self, parent, username, user_data, credentials, on_logout_callback, on_update_stats=None, open_credentials_callback=None, total=None):
         self.parent = parent
         self.username = username
         self.user_data = user_data
         self.credentials = credentials
-        self.filtered_credentials = credentials.copy()
+        # Set while credentials is only the first page: the vault's size until credentials_loaded()
+        self.total = total
+        self.filtered_credentials = credentials
         self.on_logout = on_logout_callback
         self.on_update_stats = on_update_stats
         self.open_credentials_callback = open_credentials_callback
@@ -110,8 +116,8 @@ class Dashboard:
                                anchor='w')
         welcome_title.pack(fill='x')
         
-        welcome_subtitle = tk.Label(welcome_text_frame,
-                                  text=f"Your vault is secure and protected. You have {len(self.credentials)} stored credentials.",
+        self.welcome_subtitle = welcome_subtitle = tk.Label(welcome_text_frame,
+                                  text=self.welcome_text(),
                                   font=('Arial', 12),
                                   fg='#7f8c8d',
                                   bg='white',
@@ -123,6 +129,8 @@ class Dashboard:
         stats_panel = self.create_panel(left_column, "Security Overview", padding=20)
         stats_panel.pack(fill='x', pady=(0, 20))
         
+        self.stats_panel = stats_panel
+        self.stats_container = None
         self.update_stats_display(stats_panel)
         
         # ========== MANAGEMENT PANEL ==========
@@ -172,17 +180,7 @@ class Dashboard:
         cred_header = tk.Frame(panel_content, bg='white')
         cred_header.pack(fill='x', pady=(0, 15))
         
-        total = len(self.filtered_credentials)
-        strong = sum(1 for c in self.filtered_credentials if c.get('strength') == 'Strong')
-        weak = total - strong
-        
-        # Check for weak passwords and log if any
-        if weak > 0:
-            user_email = self.user_data.get('email', self.username)
-            AuditLog.check_weak_passwords(self.filtered_credentials, user_email)
-        
         self.stats_label = tk.Label(cred_header,
-                             text=f"📊 {total} items • ✅ {strong} strong • ⚠️ {weak} weak",
                              font=('Arial', 10),
                              fg='#7f8c8d',
                              bg='white')
@@ -224,7 +222,22 @@ class Dashboard:
         self.table_container = tk.Frame(panel_content, bg='white')
         self.table_container.pack(fill='both', expand=True)
         
-        self.display_credentials_table()
+        # Stats line, weak password check and table
+        self.perform_search()
+    
+    def welcome_text(self):
+        count = len(self.credentials) if self.total is None else self.total
+        return f"Your vault is secure and protected. You have {count} stored credentials."
+    
+    def credentials_loaded(self, credentials):
+        """The whole vault is decrypted: stats, search and paging now cover every credential"""
+        self.credentials = credentials
+        self.total = None
+        if not self.frame.winfo_exists():
+            return   # another screen replaced the dashboard
+        self.welcome_subtitle.config(text=self.welcome_text())
+        self.update_stats_display(self.stats_panel)
+        self.perform_search()
     
     def create_panel(self, parent, title, padding=20):
         """Create a styled panel with shadow effect"""
@@ -297,17 +310,25 @@ class Dashboard:
     
     def update_stats_display(self, parent):
         """Update and display stats in panel"""
-        total = len(self.filtered_credentials)
-        strong = sum(1 for c in self.filtered_credentials if c.get('strength') == 'Strong')
-        weak = total - strong
+        if self.stats_container is not None:
+            self.stats_container.destroy()
+        
+        if self.total is None:
+            total = len(self.credentials)
+            strong = sum(1 for c in self.credentials if c.strength == 'Strong')
+            strong, weak = str(strong), str(total - strong)
+        else:
+            # Strength counts need the whole vault decrypted
+            total, strong, weak = self.total, "…", "…"
         
         stats_container = tk.Frame(parent, bg='white')
         stats_container.pack(fill='x')
+        self.stats_container = stats_container
         
         stats = [
             {"title": "Total Passwords", "value": str(total), "color": "#4dabf7", "icon": "🔢"},
-            {"title": "Strong Passwords", "value": str(strong), "color": "#28a745", "icon": "✅"},
-            {"title": "Weak Passwords", "value": str(weak), "color": "#dc3545", "icon": "⚠️"},
+            {"title": "Strong Passwords", "value": strong, "color": "#28a745", "icon": "✅"},
+            {"title": "Weak Passwords", "value": weak, "color": "#dc3545", "icon": "⚠️"},
         ]
         
         for i, stat in enumerate(stats):
@@ -384,89 +405,136 @@ class Dashboard:
                                   padx=15)
             header_label.place(relx=sum(widths[:i]), y=10, relwidth=width, height=20)
         
-        for i, cred in enumerate(self.filtered_credentials):
-            row_bg = '#ffffff' if i % 2 == 0 else '#f8fafc'
-            row_frame = tk.Frame(scrollable_frame, bg=row_bg, height=50)
-            row_frame.pack(fill='x', pady=(0, 1))
-            
-            service_label = tk.Label(row_frame, text=cred['service'],
-                                   font=('Arial', 11, 'bold'),
-                                   fg='#2c3e50',
-                                   bg=row_bg,
-                                   anchor='w',
-                                   padx=15)
-            service_label.place(relx=0, y=15, relwidth=0.23, height=20)
-            
-            username_label = tk.Label(row_frame, text=cred['username'],
-                                    font=('Arial', 11),
-                                    fg='#4a5568',
-                                    bg=row_bg,
-                                    anchor='w',
-                                    padx=15)
-            username_label.place(relx=0.23, y=15, relwidth=0.23, height=20)
-            
-            password_frame = tk.Frame(row_frame, bg=row_bg)
-            password_frame.place(relx=0.46, y=10, relwidth=0.20, height=30)
-            
-            password_var = tk.StringVar(value="••••••••")
-            password_label = tk.Label(password_frame, textvariable=password_var,
-                                    font=('Arial', 10, 'bold'),
-                                    fg='#718096',
-                                    bg=row_bg)
-            password_label.pack(side='left')
-            
-            eye_button = tk.Button(password_frame, text="👁",
-                                 font=('Arial', 9),
-                                 bg='#e2e8f0',
-                                 fg='#4a5568',
-                                 relief='flat',
-                                 width=3,
-                                 cursor='hand2')
-            eye_button.config(
-                command=lambda var=password_var, passwd=cred['password'], btn=eye_button, row=row_bg: 
-                self.toggle_password_table(var, passwd, btn, row)
-            )
-            eye_button.pack(side='left', padx=(5, 0))
-            
-            # Strength display (Strong/Weak only)
-            strength = cred['strength']
-            strength_color = "#28a745" if strength == "Strong" else "#dc3545"
-            strength_icon = "✅" if strength == "Strong" else "⚠️"
-            
-            strength_frame = tk.Frame(row_frame, bg=row_bg)
-            strength_frame.place(relx=0.66, y=10, relwidth=0.34, height=30)
-            
-            strength_canvas = tk.Canvas(strength_frame, bg=strength_color, highlightthickness=0, height=26)
-            strength_canvas.pack(fill='both', expand=True, padx=8, pady=2)
-            
-            strength_canvas.create_rectangle(2, 2, 130, 26, fill=strength_color, outline=strength_color)
-            
-            strength_canvas.create_text(66, 14,
-                                      text=f"{strength_icon} {strength}",
-                                      fill='white',
-                                      font=('Arial', 11, 'bold'),
-                                      anchor='center')
-            
-            row_frame.bind('<Enter>', lambda e, f=row_frame: f.config(bg='#edf2f7'))
-            row_frame.bind('<Leave>', lambda e, f=row_frame, bg=row_bg: f.config(bg=bg))
+        self.table_frame = scrollable_frame
+        self.rows_shown = 0
+        self.more_button = None
+        self.show_next_page()
+    
+    def show_next_page(self):
+        """Append the next PAGE_SIZE rows; widgets for later rows are only built on demand"""
+        if self.more_button is not None:
+            self.more_button.destroy()
+            self.more_button = None
+        
+        start = self.rows_shown
+        page = islice(self.filtered_credentials, start, start + self.PAGE_SIZE)
+        for i, cred in enumerate(page, start):
+            self.add_credential_row(self.table_frame, i, cred)
+            self.rows_shown = i + 1
+        
+        if self.total is not None and self.filtered_credentials is self.credentials:
+            remaining = self.total - self.rows_shown
+            if remaining > 0:
+                # The button comes with credentials_loaded(), which redraws the table
+                self.more_button = tk.Label(self.table_frame,
+                                          text=f"Loading {remaining} more…",
+                                          font=('Arial', 10),
+                                          fg='#7f8c8d',
+                                          bg='white')
+                self.more_button.pack(pady=10)
+            return
+        
+        remaining = len(self.filtered_credentials) - self.rows_shown
+        if remaining > 0:
+            self.more_button = tk.Button(self.table_frame,
+                                       text=f"Show more ({remaining} remaining)",
+                                       font=('Arial', 10, 'bold'),
+                                       bg='#e2e8f0',
+                                       fg='#4a5568',
+                                       relief='flat',
+                                       cursor='hand2',
+                                       command=self.show_next_page)
+            self.more_button.pack(pady=10)
+    
+    def add_credential_row(self, parent, i, cred):
+        """One table row for a credential"""
+        row_bg = '#ffffff' if i % 2 == 0 else '#f8fafc'
+        row_frame = tk.Frame(parent, bg=row_bg, height=50)
+        row_frame.pack(fill='x', pady=(0, 1))
+        
+        service_label = tk.Label(row_frame, text=cred.service,
+                               font=('Arial', 11, 'bold'),
+                               fg='#2c3e50',
+                               bg=row_bg,
+                               anchor='w',
+                               padx=15)
+        service_label.place(relx=0, y=15, relwidth=0.23, height=20)
+        
+        username_label = tk.Label(row_frame, text=cred.username,
+                                font=('Arial', 11),
+                                fg='#4a5568',
+                                bg=row_bg,
+                                anchor='w',
+                                padx=15)
+        username_label.place(relx=0.23, y=15, relwidth=0.23, height=20)
+        
+        password_frame = tk.Frame(row_frame, bg=row_bg)
+        password_frame.place(relx=0.46, y=10, relwidth=0.20, height=30)
+        
+        password_var = tk.StringVar(value="••••••••")
+        password_label = tk.Label(password_frame, textvariable=password_var,
+                                font=('Arial', 10, 'bold'),
+                                fg='#718096',
+                                bg=row_bg)
+        password_label.pack(side='left')
+        
+        eye_button = tk.Button(password_frame, text="👁",
+                             font=('Arial', 9),
+                             bg='#e2e8f0',
+                             fg='#4a5568',
+                             relief='flat',
+                             width=3,
+                             cursor='hand2')
+        eye_button.config(
+            command=lambda var=password_var, c=cred, btn=eye_button, row=row_bg: 
+            self.toggle_password_table(var, c, btn, row)
+        )
+        eye_button.pack(side='left', padx=(5, 0))
+        
+        # Strength display (Strong/Weak only)
+        strength = cred.strength
+        strength_color = "#28a745" if strength == "Strong" else "#dc3545"
+        strength_icon = "✅" if strength == "Strong" else "⚠️"
+        
+        strength_frame = tk.Frame(row_frame, bg=row_bg)
+        strength_frame.place(relx=0.66, y=10, relwidth=0.34, height=30)
+        
+        strength_canvas = tk.Canvas(strength_frame, bg=strength_color, highlightthickness=0, height=26)
+        strength_canvas.pack(fill='both', expand=True, padx=8, pady=2)
+        
+        strength_canvas.create_rectangle(2, 2, 130, 26, fill=strength_color, outline=strength_color)
+        
+        strength_canvas.create_text(66, 14,
+                                  text=f"{strength_icon} {strength}",
+                                  fill='white',
+                                  font=('Arial', 11, 'bold'),
+                                  anchor='center')
+        
+        row_frame.bind('<Enter>', lambda e, f=row_frame: f.config(bg='#edf2f7'))
+        row_frame.bind('<Leave>', lambda e, f=row_frame, bg=row_bg: f.config(bg=bg))
     
     def perform_search(self, event=None):
         """Filter credentials based on search query"""
         search_term = self.search_entry.get().lower()
         
         if search_term == "search credentials..." or search_term == "":
-            self.filtered_credentials = self.credentials.copy()
+            self.filtered_credentials = self.credentials
         else:
-            self.filtered_credentials = [
-                cred for cred in self.credentials 
-                if (search_term in cred['service'].lower() or 
-                    search_term in cred['username'].lower())
-            ]
+            self.filtered_credentials = search_credentials(self.credentials, search_term)
         
         total = len(self.filtered_credentials)
-        strong = sum(1 for c in self.filtered_credentials if c.get('strength') == 'Strong')
+        strong = sum(1 for c in self.filtered_credentials if c.strength == 'Strong')
         weak = total - strong
         
+        if self.total is not None:
+            # Only the first page is decrypted yet
+            scope = f" of the first {len(self.credentials)}" if self.filtered_credentials is not self.credentials else ""
+            self.stats_label.config(
+                text=f"📊 {total} items{scope} • loading {self.total} credentials…"
+            )
+            self.display_credentials_table()
+            return
+        
         # Check for weak passwords in search results
         if weak > 0:
             user_email = self.user_data.get('email', self.username)
@@ -484,22 +552,19 @@ class Dashboard:
         self.search_entry.insert(0, "Search credentials...")
         self.perform_search()
     
-    def toggle_password_table(self, password_var, actual_password, eye_button, row_bg):
-        """Toggle password visibility in table"""
+    def toggle_password_table(self, password_var, credential, eye_button, row_bg):
+        """Toggle password visibility in table (decrypts only this password)"""
         if password_var.get() == "••••••••":
-            password_var.set(actual_password)
+            password_var.set(credential.password)
             eye_button.config(text="👁", fg='#4dabf7', bg='#cbd5e0')
             
             # Log password view
             user_email = self.user_data.get('email', self.username)
-            # Find which service this password belongs to
-            for cred in self.filtered_credentials:
-                if cred['password'] == actual_password:
-                    AuditLog.log_password_operation("viewed", cred['service'], "Password revealed in dashboard table", user_email)
-                    break
+            AuditLog.log_password_operation("viewed", credential.service, "Password revealed in dashboard table", user_email)
         else:
             password_var.set("••••••••")
             eye_button.config(text="👁", fg='#4a5568', bg='#e2e8f0')
+            credential.forget_password()
     
     def show_credential_management(self):
         """Show credential management via callback if available"""
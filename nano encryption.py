@@ -1,29 +1,441 @@
 # encryption.py - ENCRYPTION
+import base64
+import copy
+import json
 import os
-from cryptography.fernet import Fernet
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from blind_index import compute_tags, index_terms
+from cipher_suites import SUITES, write_suite
+from durable_io import atomic_write
+from file_locks import exclusive_lock
+from store_cache import file_key
+
+# First byte of every record envelope; bump when the layout changes
+#   2: AES-256-GCM over the JSON payload
+#   3: AES-256-GCM over the raw-deflated JSON payload (preset dictionary)
+#   4: as 3, under the logged-in user's own vault key (see vault_keys)
+#   5, 6: as 3, 4 with ChaCha20-Poly1305
+#   7, 8: as 3, 4 with Fernet
+# Each version maps to (cipher suite, sealed with the user's key, payload deflated)
+ENVELOPE_FORMATS = {
+    2: ("aes-256-gcm", False, False),
+    3: ("aes-256-gcm", False, True),
+    4: ("aes-256-gcm", True, True),
+    5: ("chacha20-poly1305", False, True),
+    6: ("chacha20-poly1305", True, True),
+    7: ("fernet", False, True),
+    8: ("fernet", True, True),
+}
+# Prefix of new envelopes by (suite, user's key)
+WRITE_PREFIXES = {(suite, user): bytes([version])
+                  for version, (suite, user, deflated) in ENVELOPE_FORMATS.items() if deflated}
+
+# Every payload shares these keys and values, so deflate finds them here
+# instead of paying for them in each record. Never change it: existing
+# version 3 envelopes can only be inflated with the exact same bytes.
+PAYLOAD_ZDICT = (b'{"service":"","username":"","password":"",'
+                 b'"category":"General","strength":"Strong"}"Weak""Medium"'
+                 b'.com@gmail.com')
+
+
+def derive_raw_key(key, info, salt=None):
+    """32-byte key for one purpose, derived from raw key bytes"""
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        info=info
+    ).derive(bytes(key))
+
+
+def derive_key(key, info, salt=None):
+    """32-byte key for one purpose, derived from a Fernet-format installation key"""
+    return derive_raw_key(base64.urlsafe_b64decode(key), info, salt)
+
+
+def derive_suites(key, info):
+    """Every cipher suite, each keyed with derive_raw_key(key, info + its label)"""
+    return {name: suite(derive_raw_key(key, info + suite.label)) for name, suite in SUITES.items()}
+
+
+def load_payload(version, payload):
+    """Fields of an opened envelope payload (inflated unless version 2)"""
+    if ENVELOPE_FORMATS[version][2]:
+        decompressor = zlib.decompressobj(-15, zdict=PAYLOAD_ZDICT)
+        payload = decompressor.decompress(payload) + decompressor.flush()
+    return json.loads(payload)
+
 
 class EncryptionManager:
+    # Batches at least this large are split across a thread pool. The
+    # cryptography primitives release the GIL, so chunks run in parallel.
+    BATCH_THRESHOLD = 512
+    BATCH_CHUNK_SIZE = 128
+
     def __init__(self):
         self.key_file = "vault_key.key"
+        self.retired_key_file = "vault_key.retired"
+        self.batch_threshold = self.BATCH_THRESHOLD
+        self.batch_workers = min(32, os.cpu_count() or 1)
+        self.pool = None
+        self.user_key = None      # logged-in user's vault key (bytearray) while unlocked
+        self.user_suites = None
+        self.write_suite = write_suite()
+        self.user_index_key = None
+        self.keys = []
         self.load_or_create_key()
     
     def load_or_create_key(self):
         """Load or generate encryption key"""
-        if os.path.exists(self.key_file):
-            with open(self.key_file, "rb") as f:
-                self.key = f.read()
-        else:
-            self.key = Fernet.generate_key()
-            with open(self.key_file, "wb") as f:
-                f.write(self.key)
-        
-        self.cipher = Fernet(self.key)
+        # Under the key file's lock, so instances starting together create one key
+        with exclusive_lock(self.key_file):
+            if not os.path.exists(self.key_file):
+                atomic_write(self.key_file, Fernet.generate_key() + b"\n")
+            self.key_signature = file_key(self.key_file)
+            self.set_keys(self.read_keys())
+
+    # ---------------- Keyring ----------------
+    def read_keys(self):
+        """Keys in the key file: the current one first, then keys a rotation is retiring"""
+        with open(self.key_file, "rb") as f:
+            return f.read().split()
+
+    def read_retired_keys(self):
+        """Keys retire_keys() dropped from the ring, newest first; only old backups need them"""
+        if not os.path.exists(self.retired_key_file):
+            return []
+        with open(self.retired_key_file, "rb") as f:
+            return f.read().split()
+
+    def set_keys(self, keys):
+        # Every cipher object is rebuilt: keys dropped from the file are not kept in memory
+        keys = list(keys)
+        self.keys = keys
+        self.key = keys[0]
+
+        # New Fernet tokens use the current key; any key in the ring opens them
+        self.current_fernet = Fernet(self.key)
+        self.cipher = MultiFernet([Fernet(key) for key in keys])
+
+        # Record envelopes use the cipher suites under keys derived from the vault key
+        self.record_suites = [derive_suites(base64.urlsafe_b64decode(key), b"secure-vault record envelope v2")
+                              for key in keys]
+        self.record_index_keys = [derive_key(key, b"secure-vault blind index v1") for key in keys]
+
+    def refresh_keys(self):
+        """Reload the keyring if a rotation (here or in another instance) rewrote it; True if it did"""
+        signature = file_key(self.key_file)
+        if signature == self.key_signature:
+            return False
+        self.key_signature = signature
+        self.set_keys(self.read_keys())
+        return True
+
+    def add_key(self):
+        """Make a new key current; the others stay in the ring for reading until retire_keys()"""
+        with exclusive_lock(self.key_file):
+            keys = [Fernet.generate_key()] + self.read_keys()
+            atomic_write(self.key_file, b"\n".join(keys) + b"\n")
+            self.refresh_keys()
+
+    def retire_keys(self):
+        """
+        Leave only the current key in the key file once nothing is sealed
+        under the others. They move to the retired key file, which only
+        restoring a backup made before the rotation reads.
+        """
+        with exclusive_lock(self.key_file):
+            keys = self.read_keys()
+            if len(keys) > 1:
+                retired = keys[1:] + [key for key in self.read_retired_keys() if key not in keys]
+                atomic_write(self.retired_key_file, b"\n".join(retired) + b"\n")
+            atomic_write(self.key_file, keys[0] + b"\n")
+            self.refresh_keys()
+
+    def with_retired_keys(self):
+        """
+        A copy of this manager whose ring also holds the retired keys, to
+        open (and rotate_record) data from before a rotation. It still seals
+        under the current key; drop it when done.
+        """
+        archive = copy.copy(self)
+        archive.set_keys(self.keys + [key for key in self.read_retired_keys() if key not in self.keys])
+        return archive
     
+    # ---------------- Bytes API ----------------
+    def encrypt_bytes(self, data):
+        """Fernet token (bytes) for bytes-like data"""
+        # Fernet only takes bytes; bytearray / memoryview are copied once here
+        return self.cipher.encrypt(data if isinstance(data, bytes) else bytes(data))
+
+    def decrypt_bytes(self, token):
+        """Plaintext bytes of a Fernet token given as bytes, str or any bytes-like object"""
+        token = token if isinstance(token, (bytes, str)) else bytes(token)
+        try:
+            return self.cipher.decrypt(token)
+        except InvalidToken:
+            # Possibly made under a key another instance has just rotated in
+            if not self.refresh_keys():
+                raise
+            return self.cipher.decrypt(token)
+
     def encrypt(self, text):
-        """Encrypt text"""
-        return self.cipher.encrypt(text.encode()).decode()
+        """Encrypt text (str wrapper over encrypt_bytes)"""
+        return self.encrypt_bytes(text.encode()).decode()
     
     def decrypt(self, encrypted):
-        """Decrypt text"""
-        return self.cipher.decrypt(encrypted.encode()).decode()
+        """Decrypt text (str wrapper over decrypt_bytes)"""
+        # Fernet reads str tokens directly, no encode needed here
+        return self.decrypt_bytes(encrypted).decode()
+
+    # ---------------- Record Envelopes ----------------
+    def seal_envelope(self, fields, cred_id):
+        """
+        Raw envelope bytes sealing all fields of a credential: version |
+        sealed payload, in the write suite (see cipher_suites). Sealed with
+        the user's key while unlocked, otherwise (tools, migrations) with
+        the installation key.
+        """
+        user_suites = self.user_suites
+        if user_suites is not None:
+            suite, prefix = user_suites[self.write_suite], WRITE_PREFIXES[self.write_suite, True]
+        else:
+            self.refresh_keys()   # one stat; never seal under a key being retired
+            suite, prefix = self.record_suites[0][self.write_suite], WRITE_PREFIXES[self.write_suite, False]
+        payload = json.dumps(fields, separators=(",", ":")).encode()
+        # Compress before encrypting; ciphertext does not compress
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=PAYLOAD_ZDICT)
+        payload = compressor.compress(payload) + compressor.flush()
+        # The id is authenticated data, so envelopes cannot be swapped between records
+        return suite.seal(prefix, payload, cred_id.encode())
+
+    def open_envelope(self, data, cred_id):
+        """Fields of a raw envelope given as bytes, bytearray or memoryview"""
+        # Nonce and ciphertext are views into data, not copies
+        view = memoryview(data)
+        return load_payload(view[0], self.open_sealed(view, cred_id)[1])
+
+    def open_sealed(self, view, cred_id):
+        """
+        (index of the installation key that opened it, or None for the
+        user's key; stored payload, still deflated for version 3+)
+        """
+        if view[0] not in ENVELOPE_FORMATS:
+            raise ValueError(f"Unsupported record version: {view[0]}")
+        name, user, _ = ENVELOPE_FORMATS[view[0]]
+        sealed, aad = view[1:], cred_id.encode()
+        if user:
+            if self.user_suites is None:
+                raise ValueError("Vault is locked: log in to open this record")
+            return None, self.user_suites[name].open(sealed, aad)
+
+        while True:
+            # Current key first: outside a rotation it is the only one
+            for index, suites in enumerate(self.record_suites):
+                try:
+                    return index, suites[name].open(sealed, aad)
+                except InvalidTag:
+                    continue
+            if not self.refresh_keys():
+                raise InvalidTag()
+
+    def encrypt_record(self, fields, cred_id):
+        """Seal all fields of a credential into one authenticated envelope (base64 str)"""
+        return base64.urlsafe_b64encode(self.seal_envelope(fields, cred_id)).decode()
+
+    def decrypt_record(self, envelope, cred_id):
+        """Open an envelope created by encrypt_record"""
+        return self.open_envelope(base64.urlsafe_b64decode(envelope), cred_id)
+
+    def open_record(self, record, with_password=False):
+        """
+        Plaintext fields of a stored record, envelope or legacy layout.
+        Legacy records hold one Fernet token per field, so their password is
+        only decrypted when asked for.
+        """
+        if "envelope" in record:
+            fields = self.decrypt_record(record["envelope"], record["id"])
+            if not with_password:
+                del fields["password"]
+            return fields
+
+        fields = {
+            "service": self.decrypt(record["service"]),
+            "username": self.decrypt(record["username"]),
+            "category": record.get("category", "General"),
+            "strength": record.get("strength", "Medium")
+        }
+        if with_password:
+            fields["password"] = self.decrypt(record["password"])
+        return fields
+
+    def record_password(self, record):
+        """Decrypt just the password of a stored record"""
+        if "envelope" in record:
+            return self.decrypt_record(record["envelope"], record["id"])["password"]
+        return self.decrypt(record["password"])
+
+    def seal_for_user(self, record):
+        """
+        The stored record re-sealed under the unlocked user's key, with its
+        blind index, or None if it already is sealed with a user's key
+        """
+        if self.user_suites is None:
+            raise ValueError("Vault is locked: log in to re-seal records")
+        if "envelope" in record and ENVELOPE_FORMATS[base64.urlsafe_b64decode(record["envelope"][:4])[0]][1]:
+            return None
+        fields = self.open_record(record, with_password=True)
+        resealed = {"id": record["id"], "envelope": self.encrypt_record(fields, record["id"])}
+        resealed["index"] = self.index_record(resealed, fields)
+        return resealed
+
+    def foreign_record(self, record):
+        """
+        True for a record sealed with a user's own key that the unlocked
+        key does not open (another user's, or any user's while locked)
+        """
+        if "envelope" not in record:
+            return False
+        view = memoryview(base64.urlsafe_b64decode(record["envelope"]))
+        if view[0] not in ENVELOPE_FORMATS or not ENVELOPE_FORMATS[view[0]][1]:
+            return False
+        if self.user_suites is None:
+            return True
+        try:
+            self.open_sealed(view, record["id"])
+        except InvalidTag:
+            return True
+        return False
+
+    def rotate_record(self, record):
+        """
+        The stored record re-sealed under the current installation key, or
+        None if it already is (or is sealed with a user's own key, which
+        installation key rotation does not touch). The blind index moves to
+        the current key with it.
+        """
+        if "envelope" in record:
+            view = memoryview(base64.urlsafe_b64decode(record["envelope"]))
+            if view[0] in ENVELOPE_FORMATS and ENVELOPE_FORMATS[view[0]][1]:
+                return None
+            index, payload = self.open_sealed(view, record["id"])
+            if index == 0:
+                return None
+            # The payload is re-encrypted as stored, in the same suite: no inflate/deflate round trip
+            suite = self.record_suites[0][ENVELOPE_FORMATS[view[0]][0]]
+            sealed = suite.seal(bytes(view[:1]), payload, record["id"].encode())
+            envelope = base64.urlsafe_b64encode(sealed).decode()
+            fields = load_payload(view[0], payload)
+            return dict(record, envelope=envelope, index=self.installation_index(fields))
+
+        # Legacy layout: one Fernet token per field
+        rotated = dict(record)
+        for name in ("service", "username", "password"):
+            try:
+                self.current_fernet.extract_timestamp(record[name])   # verifies, no decrypt
+            except InvalidToken:
+                rotated[name] = self.cipher.rotate(record[name]).decode()
+        if rotated == record:
+            return None
+        rotated["index"] = self.installation_index({"service": self.decrypt(record["service"]),
+                                                    "username": self.decrypt(record["username"])})
+        return rotated
+
+    # ---------------- Blind Index ----------------
+    def index_keys(self):
+        """HMAC keys a blind index search tries: the user's (while unlocked), then the installation's"""
+        if self.user_index_key is None:
+            return list(self.record_index_keys)
+        return [self.user_index_key] + self.record_index_keys
+
+    def installation_index(self, fields):
+        return compute_tags(self.record_index_keys[0], index_terms(fields["service"], fields["username"]))
+
+    def index_record(self, record, fields):
+        """Blind index tags of a stored record, under the key family that sealed it (see blind_index)"""
+        if "envelope" in record and ENVELOPE_FORMATS[base64.urlsafe_b64decode(record["envelope"][:4])[0]][1]:
+            if self.user_index_key is None:
+                raise ValueError("Vault is locked: log in to index this record")
+            return compute_tags(self.user_index_key, index_terms(fields["service"], fields["username"]))
+        return self.installation_index(fields)
+
+    # ---------------- User Vault Keys ----------------
+    def unlock(self, user_key):
+        """Seal and open user-key envelopes (versions 4, 6, 8) with the user's vault key until lock()"""
+        self.user_key = user_key
+        self.user_suites = derive_suites(user_key, b"secure-vault user records v1")
+        self.user_index_key = derive_raw_key(user_key, b"secure-vault blind index v1")
+
+    def lock(self):
+        """Zero the session's copy of the user's key and drop the ciphers (logout)"""
+        if self.user_key is not None:
+            self.user_key[:] = bytes(len(self.user_key))
+        self.user_key = None
+        self.user_suites = None
+        self.user_index_key = None
+
+    def recovery_cipher(self):
+        """AES-256-GCM under the installation key for the vault key recovery wrap (password resets)"""
+        return self.recovery_ciphers()[0]
+
+    def recovery_ciphers(self):
+        """Recovery ciphers for every key in the ring, current first (key rotation re-wraps)"""
+        return [AESGCM(derive_key(key, b"secure-vault key recovery v1")) for key in self.keys]
+
+    # ---------------- Backup Archives ----------------
+    def backup_cipher(self, salt, key=None):
+        """AES-256-GCM for one backup archive, keyed from the vault key and the archive's salt"""
+        return AESGCM(derive_key(key or self.key, b"secure-vault backup archive v1", salt))
+
+    def backup_ciphers(self, salt):
+        """Ciphers an archive may have been written with: the ring's keys, then the retired ones"""
+        keys = self.keys + [key for key in self.read_retired_keys() if key not in self.keys]
+        return [self.backup_cipher(salt, key) for key in keys]
+
+    # ---------------- Batch API ----------------
+    def encrypt_many(self, texts):
+        """Encrypt a list of strings, results in input order"""
+        return self.map_batch(self.encrypt, texts)
+
+    def decrypt_many(self, tokens):
+        """Decrypt a list of tokens, results in input order"""
+        return self.map_batch(self.decrypt, tokens)
+
+    def open_records(self, records):
+        """open_record for a list of stored records, results in input order"""
+        return self.map_batch(self.open_record, records)
+
+    def seal_records(self, items):
+        """encrypt_record for a list of (fields, cred_id) pairs, results in input order"""
+        return self.map_batch(lambda item: self.encrypt_record(*item), items)
+
+    def map_batch(self, func, items):
+        items = list(items)
+        if len(items) < self.batch_threshold or self.batch_workers < 2:
+            return [func(item) for item in items]
+
+        size = self.BATCH_CHUNK_SIZE
+        chunks = [items[i:i + size] for i in range(0, len(items), size)]
+        results = []
+        # Executor.map yields chunk results in submission order
+        for chunk_result in self.get_pool().map(lambda chunk: [func(item) for item in chunk], chunks):
+            results.extend(chunk_result)
+        return results
+
+    def get_pool(self):
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.batch_workers,
+                                           thread_name_prefix="vault-crypto")
+        return self.pool
 
+    def shutdown(self):
+        """Stop the batch worker threads"""
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
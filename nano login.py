@@ -2,10 +2,9 @@
 import tkinter as tk
 from tkinter import messagebox
 import bcrypt
-import json
-import os
 import re
 from datetime import datetime
+from storage import get_repository
 
 def create_login_screen(parent, on_login_callback, on_register_callback):
     """
@@ -501,35 +500,39 @@ def create_forgot_password_screen(parent, on_login_callback, on_register_callbac
             return
         
         # Check if username exists
-        users_file = "users.json"
-        if not os.path.exists(users_file):
+        users = get_repository().users
+        user_data = users.get(username)
+        if user_data is None:
             messagebox.showerror("Error", "Username not found!")
             return
         
-        with open(users_file, "r") as f:
-            users = json.load(f)
-        
-        if username not in users:
-            messagebox.showerror("Error", "Username not found!")
+        # Update password and re-wrap the vault key under it
+        from encryption import EncryptionManager
+        from vault_keys import key_recoverable, reset_user_key
+        if not key_recoverable(user_data):
+            messagebox.showerror("Reset Not Available",
+                                 "Your vault is protected by your master password only, so it "
+                                 "cannot be reset without it.\n\n"
+                                 "Key recovery is turned off on this installation.")
             return
-        
-        # Update password
         hashed_password = bcrypt.hashpw(new_password.encode(), bcrypt.gensalt()).decode()
-        users[username]["password"] = hashed_password
-        
-        # Save updated users
-        with open(users_file, "w") as f:
-            json.dump(users, f, indent=4)
+        user_data["password"] = hashed_password
+        reset_user_key(username, user_data, new_password, EncryptionManager().recovery_cipher())
         
-        # Log password reset
+        # Save updated user and log the reset as one recoverable change
         from audit_log import AuditLog
-        user_email = users[username].get('email', username)
-        AuditLog.log_event(
+        from recovery_log import get_recovery_log
+        user_email = user_data.get('email', username)
+        event = AuditLog.new_event(
             event_type="PASSWORD_RESET",
             severity="WARNING",
             description="Master password was reset successfully",
             user=user_email
         )
+        get_recovery_log().run([
+            ["users.put", username, user_data],
+            ["audit", event]
+        ])
         
         messagebox.showinfo("Success", 
                           f"Password reset successfully!\n\n" +
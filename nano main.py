@@ -5,13 +5,23 @@ Run this file to start the application
 """
 
 import tkinter as tk
-import json
-import os
 import bcrypt
 from login import create_login_screen
 from dashboard import Dashboard
 from encryption import EncryptionManager
 from credential_management import CredentialManager
+from storage import get_repository
+from durable_io import flush_pending
+from persistence import get_persistence
+from recovery_log import get_recovery_log
+from session_cache import CredentialCache
+from credential_record import Credential, CredentialIndex
+from vault_keys import derive_wrapping_key, kdf_params, migrate_user_records, unlock_stored_key
+from key_rotation import KeyRotation
+
+ROTATION_PAUSE_MS = 20   # idle time between key rotation batches
+ROTATION_POLL_MS = 2000  # how often rotations started or finished elsewhere are picked up
+MIGRATION_PAUSE_MS = 20  # idle time between batches moving records to the user's key
 
 
 class SecureVaultApp:
@@ -29,10 +39,22 @@ class SecureVaultApp:
         self.current_user = None
         self.user_data = None
         self.failed_attempts = 0
-
-        # ---------------- File Paths ----------------
-        self.users_file = "users.json"
-        self.vault_file = "vault.json"
+        self.closing = False   # window closed: no more background steps are scheduled
+        self.rotation_active = False      # a rotation batch is queued or scheduled
+        self.session_key_signature = None   # key file the session's stored records match
+        self.user_key_migration = None   # token of the logged-in session's migration pass
+
+        # ---------------- Storage (JSON files or SQLite) ----------------
+        self.repository = get_repository()
+        self.vault_store = self.repository.vault
+        self.persisted_ids = set()   # ids of the current user's records in the store
+        self.unsaved_audit_events = []   # from a failed save; retried with the next one
+        self.credential_cache = CredentialCache(self.vault_store)
+        self.recovery_log = get_recovery_log()
+
+        # ---------------- Background Saves ----------------
+        self.persistence = get_persistence()
+        self.persistence.attach(self.root)
 
         # ---------------- Credential Manager ----------------
         self.credential_manager = CredentialManager(
@@ -40,21 +62,39 @@ class SecureVaultApp:
             current_user=None,
             update_callback=self.update_vault_data,
             encryption=self.encryption,
-            dashboard_callback=self.show_dashboard   # ✅ FIX ADDED
+            dashboard_callback=self.show_dashboard,   # ✅ FIX ADDED
+            reload_callback=self.reload_dashboard
         )
 
         # ---------------- Create Sample Data ----------------
         self.initialize_sample_data()
 
+        # ---------------- Key Rotation (continues in the background) ----------------
+        self.key_rotation = KeyRotation(self.encryption, self.vault_store, self.repository.users)
+        self.watch_key_rotation()
+
         # ---------------- Start Login ----------------
         self.show_login()
 
         # ---------------- Run App ----------------
         self.root.mainloop()
+        self.closing = True
+        try:
+            self.persistence.shutdown()
+        finally:
+            self.vault_store.close()
+            flush_pending()
+            self.encryption.lock()
+            self.encryption.shutdown()
 
     # ---------------- Sample Users & Vault ----------------
     def initialize_sample_data(self):
-        if not os.path.exists(self.users_file):
+        # Creates the stores on first run, migrating older layouts if present
+        self.repository.initialize()
+        # Finish multi-store saves that a crash interrupted
+        self.recovery_log.recover()
+
+        if not self.repository.users.all():
             users = {
                 "john.doe": {
                     "name": "John Doe",
@@ -75,12 +115,52 @@ class SecureVaultApp:
                     "created": "2024-03-10"
                 }
             }
-            with open(self.users_file, "w") as f:
-                json.dump(users, f, indent=4)
-
-        if not os.path.exists(self.vault_file):
-            with open(self.vault_file, "w") as f:
-                json.dump({}, f, indent=4)
+            for username, data in users.items():
+                self.repository.users.put(username, data)
+
+    # ---------------- Key Rotation ----------------
+    def watch_key_rotation(self):
+        """Pick up rotations started (or finished) by another instance or key_rotation.py"""
+        if self.closing:
+            return
+        self.encryption.refresh_keys()
+        if self.encryption.key_signature != self.session_key_signature:
+            self.refresh_session_records()
+        if not self.rotation_active:
+            self.resume_key_rotation()
+        self.root.after(ROTATION_POLL_MS, self.watch_key_rotation)
+
+    def resume_key_rotation(self):
+        """One batch per persistence job, so saves and screen loads run in between"""
+        self.rotation_active = self.key_rotation.in_progress()
+        if self.rotation_active:
+            self.persistence.submit(self.key_rotation.step, on_done=self.key_rotation_step_done)
+
+    def key_rotation_step_done(self, more):
+        if self.closing:
+            return   # the saved cursor resumes it at the next start
+        if more:
+            self.root.after(ROTATION_PAUSE_MS, self.resume_key_rotation)
+        else:
+            self.rotation_active = False
+            self.refresh_session_records()
+
+    def refresh_session_records(self):
+        """
+        The key ring changed, here or elsewhere: swap the session's stored
+        records for the current ones, so passwords still open once the keys
+        the old copies were sealed under are retired
+        """
+        self.session_key_signature = self.encryption.key_signature
+        credentials = self.credential_cache.credentials
+        if credentials is None or self.current_user is None:
+            return
+        self.persistence.drain()
+        records = {record["id"]: record for record in self.vault_store.get_user_records(self.current_user)}
+        for cred in credentials:
+            record = records.get(cred.id)
+            if record is not None and not cred.dirty:
+                cred.password_token = record
 
     # ---------------- Login Screen ----------------
     def show_login(self):
@@ -99,18 +179,20 @@ class SecureVaultApp:
     def handle_login(self, username, password):
         from tkinter import messagebox
 
-        with open(self.users_file, "r") as f:
-            users = json.load(f)
-
-        if username in users:
-            user_data = users[username]
+        user_data = self.repository.users.get(username)
+        if user_data is not None:
+            # The vault key's scrypt derivation runs while bcrypt checks the password
+            params = kdf_params(user_data.get("vault_key"))
+            derivation = self.encryption.get_pool().submit(derive_wrapping_key, password, params)
             if bcrypt.checkpw(password.encode(), user_data["password"].encode()):
+                user_data = self.unlock_vault(username, password, params, derivation.result())
                 self.current_user = username
                 self.user_data = user_data
                 self.failed_attempts = 0
 
                 self.credential_manager.current_user = self.current_user
                 self.show_dashboard()
+                self.start_user_key_migration()
                 return
             else:
                 self.failed_attempts += 1
@@ -125,21 +207,100 @@ class SecureVaultApp:
         else:
             messagebox.showerror("Login Failed", "Invalid username or password!")
 
+    def unlock_vault(self, username, password, params, wrapping_key):
+        """
+        Open the user's vault key once; the EncryptionManager keeps it until
+        logout. Returns the user's entry as stored with the key.
+        """
+        key, user_data = unlock_stored_key(self.repository.users, username, password, params, wrapping_key,
+                                           self.encryption.recovery_cipher())
+        self.encryption.unlock(key)
+        return user_data
+
+    # ---------------- User Key Migration ----------------
+    def start_user_key_migration(self):
+        """Move the user's installation-key records under their vault key, one page per job"""
+        self.user_key_migration = token = object()
+        self.resume_user_key_migration(token, 0)
+
+    def resume_user_key_migration(self, token, position):
+        if self.closing or token is not self.user_key_migration:
+            return   # logged out (or closed): the next login starts a new pass
+        self.persistence.submit(
+            self.migrate_user_page, self.current_user, position,
+            on_done=lambda result: self.user_key_migration_step_done(token, result)
+        )
+
+    def migrate_user_page(self, user, position):
+        """Persistence thread"""
+        before = self.vault_store.stat_signature(user)
+        next_position = migrate_user_records(self.vault_store, self.encryption, user, position)
+        return user, next_position, before, self.vault_store.stat_signature(user)
+
+    def user_key_migration_step_done(self, token, result):
+        user, next_position, before, after = result
+        # The session's copies still open under the installation key: no reload needed
+        self.credential_cache.refresh_signature(user, before, after)
+        if next_position is not None and not self.closing:
+            self.root.after(MIGRATION_PAUSE_MS, lambda: self.resume_user_key_migration(token, next_position))
+
     # ---------------- Dashboard ----------------
+    def load_credentials(self):
+        """Session credential list shared by the dashboard and credential manager"""
+        # Queued saves must land before the store is read or its signature checked
+        self.persistence.drain()
+        credentials = self.credential_cache.get(self.current_user)
+        if credentials is None:
+            credentials = self.adopt_credentials(self.current_user, self.read_credentials(self.current_user))
+        return credentials
+
+    def read_credentials(self, user, count=None):
+        """
+        Decrypt the user's first count records (all by default) from the
+        vault store; runs on the UI or the persistence thread. Returns
+        (store signature, key file signature, credentials), the signatures
+        taken before the read.
+        """
+        signature = self.vault_store.stat_signature(user)
+        key_signature = self.encryption.key_signature
+        if count is None:
+            records = self.vault_store.get_user_records(user)
+        else:
+            records = self.vault_store.page_user_records(user, 0, count)
+
+        # One batch for every record (a single envelope each, or the service
+        # and username tokens of legacy records); large vaults use all cores
+        opened = self.encryption.open_records(records)
+
+        # Password stays encrypted until it is revealed or edited
+        credentials = CredentialIndex(Credential.from_record(cred, fields, self.encryption)
+                                      for cred, fields in zip(records, opened))
+        return signature, key_signature, credentials
+
+    def adopt_credentials(self, user, result):
+        """Make a complete read_credentials result the session's credential list"""
+        signature, key_signature, credentials = result
+        self.session_key_signature = key_signature
+        self.persisted_ids = {cred.id for cred in credentials}
+        self.credential_cache.fill(user, credentials, signature)
+        return credentials
+
     def show_dashboard(self):
-        with open(self.vault_file, "r") as f:
-            vault_data = json.load(f)
-
-        credentials = []
-        if self.current_user in vault_data:
-            for cred in vault_data[self.current_user]:
-                credentials.append({
-                    'service': self.encryption.decrypt(cred['service']),
-                    'username': self.encryption.decrypt(cred['username']),
-                    'password': self.encryption.decrypt(cred['password']),
-                    'category': cred.get('category', 'General'),
-                    'strength': cred.get('strength', 'Medium')
-                })
+        self.persistence.drain()
+        user = self.current_user
+        credentials = self.credential_cache.get(user)
+        total = None
+        if credentials is None:
+            # Only the first screen is read and decrypted before the dashboard
+            # shows; the whole vault follows on the persistence worker
+            total = self.vault_store.count_user_records(user)
+            first_page = self.read_credentials(user, Dashboard.PAGE_SIZE)
+            if len(first_page[2]) >= total:
+                credentials, total = self.adopt_credentials(user, first_page), None
+            else:
+                credentials = first_page[2]
+                self.persistence.submit(self.read_credentials, user,
+                                        on_done=lambda result: self.vault_loaded(user, result))
 
         self.dashboard = Dashboard(
             self.root,
@@ -148,31 +309,107 @@ class SecureVaultApp:
             credentials,
             self.handle_logout,
             self.update_vault_data,
-            self.open_credentials_manager
+            self.open_credentials_manager,
+            total=total
         )
 
-    def update_vault_data(self, updated_credentials):
-        encrypted_creds = []
+    def vault_loaded(self, user, result):
+        if user != self.current_user or self.credential_cache.credentials is not None:
+            return   # logged out, or loaded whole in the meantime
+        self.dashboard.credentials_loaded(self.adopt_credentials(user, result))
+
+    def update_vault_data(self, updated_credentials, audit_events=()):
+        """
+        Snapshot dirty credentials and hand encryption and journaling to the
+        persistence worker; clean ones keep their stored records. Audit
+        entries describing the change are written in the same transaction.
+        If the save fails, the changes are marked unsaved again and go out
+        with the next one.
+        """
+        changes = []
+        added = set()
+        seen = set()
         for cred in updated_credentials:
-            encrypted_creds.append({
-                'service': self.encryption.encrypt(cred['service']),
-                'username': self.encryption.encrypt(cred['username']),
-                'password': self.encryption.encrypt(cred['password']),
-                'category': cred.get('category', 'General'),
-                'strength': cred['strength']
-            })
-
-        vault = {}
-        if os.path.exists(self.vault_file):
-            with open(self.vault_file, "r") as f:
-                vault = json.load(f)
-
-        vault[self.current_user] = encrypted_creds
-
-        with open(self.vault_file, "w") as f:
-            json.dump(vault, f, indent=4)
+            seen.add(cred.id)
+
+            if not cred.dirty:
+                continue
+
+            changes.append((cred, cred.fields()))
+            cred.dirty = False
+            if cred.id not in self.persisted_ids:
+                added.add(cred.id)
+                self.persisted_ids.add(cred.id)
+
+        deleted = self.persisted_ids - seen
+        self.persisted_ids &= seen
+        audit_events = self.unsaved_audit_events + list(audit_events)
+        self.unsaved_audit_events = []
+        if changes or deleted or audit_events:
+            user = self.current_user
+            self.persistence.submit(
+                self.write_vault_changes, user, changes, deleted, audit_events,
+                on_done=self.vault_changes_saved,
+                on_error=lambda error: self.vault_changes_failed(error, user, changes, added, deleted,
+                                                                 audit_events)
+            )
+
+    def write_vault_changes(self, user, changes, deleted, audit_events):
+        """
+        Persistence thread: encrypt the snapshots, then write them and the
+        audit entries through the recovery log so neither lands without the other
+        """
+        saved = [(cred, Credential.seal(cred.id, fields, self.encryption)) for cred, fields in changes]
+        before = self.vault_store.stat_signature(user)
+
+        operations = []
+        if saved:
+            operations.append(["vault.put_many", user, [record for _, record in saved]])
+        operations.extend(["vault.delete", user, cred_id] for cred_id in deleted)
+        operations.extend(["audit", entry] for entry in audit_events)
+        self.recovery_log.run(operations)
+        return user, saved, before, self.vault_store.stat_signature(user)
+
+    def vault_changes_saved(self, result):
+        user, saved, before, after = result
+        for cred, record in saved:
+            if not cred.dirty:   # not edited again while the save was queued
+                cred.saved_as(record, self.encryption.record_password)
+        self.credential_cache.refresh_signature(user, before, after)
+
+    def vault_changes_failed(self, error, user, changes, added, deleted, audit_events):
+        if user == self.current_user:
+            for cred, _ in changes:
+                cred.dirty = True
+            self.persisted_ids -= added
+            self.persisted_ids |= deleted
+            self.unsaved_audit_events = audit_events + self.unsaved_audit_events
+        self.persistence.report_error(error)
+
+    def reload_dashboard(self):
+        """
+        Dashboard after records were added behind the session's back
+        (import, restore). Stat signatures cannot be relied on to notice
+        them: SQLite's data_version ignores this connection's own commits.
+        """
+        self.persistence.drain()
+        self.credential_cache.clear()
+        self.show_dashboard()
 
     def handle_logout(self):
+        self.persistence.drain()
+        # One more try for changes a failed save left unsaved
+        credentials = self.credential_cache.credentials
+        if credentials is not None and (self.unsaved_audit_events or any(cred.dirty for cred in credentials)):
+            self.update_vault_data(credentials)
+            self.persistence.drain()
+        self.vault_store.close()
+        flush_pending()
+        self.credential_cache.clear()
+        self.user_key_migration = None
+        self.encryption.lock()
+        self.persisted_ids = set()
+        self.unsaved_audit_events = []
         self.current_user = None
         self.user_data = None
         self.failed_attempts = 0
@@ -182,15 +419,9 @@ class SecureVaultApp:
     def open_credentials_manager(self):
         self.credential_manager.current_user = self.current_user
 
-        self.credential_manager.data["users"][self.current_user] = {"credentials": []}
-        with open(self.vault_file, "r") as f:
-            for cred in json.load(f).get(self.current_user, []):
-                self.credential_manager.data["users"][self.current_user]["credentials"].append({
-                    "service": self.encryption.decrypt(cred['service']),
-                    "username": self.encryption.decrypt(cred['username']),
-                    "password": self.encryption.decrypt(cred['password']),
-                    "strength": cred.get('strength', 'Medium')
-                })
+        self.credential_manager.data["users"][self.current_user] = {
+            "credentials": self.load_credentials()
+        }
 
         self.credential_manager.show_credentials()
 
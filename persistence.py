@@ -0,0 +1,118 @@
+# persistence.py - BACKGROUND PERSISTENCE WORKER
+import queue
+import threading
+from tkinter import TclError, messagebox
+
+
+class PersistenceWorker:
+    """
+    Runs store writes on one background thread so Tk callbacks return right
+    away. Jobs run in submission order from a bounded queue; when the disk
+    falls behind, submit() waits for a free slot instead of growing memory.
+
+    Completions and errors are collected on a results queue that the Tk
+    thread polls with root.after, so callbacks always run on the UI thread
+    and the worker never calls into Tk itself.
+    """
+
+    QUEUE_SIZE = 64
+    POLL_MS = 50
+
+    def __init__(self, queue_size=QUEUE_SIZE):
+        self.jobs = queue.Queue(queue_size)
+        self.results = queue.Queue()
+        self.root = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+    # ---------------- Lifecycle ----------------
+    def attach(self, root):
+        """Deliver callbacks on root's event loop"""
+        self.root = root
+        self.root.after(self.POLL_MS, self.poll)
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="persistence", daemon=True)
+                self.thread.start()
+
+    def drain(self):
+        """Block until every queued job has finished and its callback has run"""
+        if self.thread is not None:
+            self.jobs.join()
+        self.deliver()
+
+    def shutdown(self):
+        """Drain the queue and stop the worker thread (after the window has closed)"""
+        # Detach first: the callbacks drained below must not schedule on or report to the window
+        self.root = None
+        self.drain()
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            self.jobs.put(None)
+            thread.join()
+
+    # ---------------- Jobs ----------------
+    def submit(self, func, *args, on_done=None, on_error=None):
+        """Queue func(*args); on_done(result) / on_error(error) run on the UI thread"""
+        self.start()
+        self.jobs.put((func, args, on_done, on_error))
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                if job is None:
+                    return
+                func, args, on_done, on_error = job
+                try:
+                    result = func(*args)
+                except Exception as error:
+                    self.results.put((on_error or self.report_error, error))
+                else:
+                    if on_done is not None:
+                        self.results.put((on_done, result))
+            finally:
+                self.jobs.task_done()
+
+    # ---------------- UI Thread ----------------
+    def deliver(self):
+        """Run the callbacks of finished jobs (UI thread only)"""
+        while True:
+            try:
+                callback, value = self.results.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                callback(value)
+            except TclError:
+                if self.root is not None:
+                    raise
+                # Shutting down: the window the callback wanted is gone
+                if isinstance(value, Exception):
+                    print(f"Save failed: {value}")
+
+    def poll(self):
+        if self.root is None:
+            return
+        self.deliver()
+        self.root.after(self.POLL_MS, self.poll)
+
+    def report_error(self, error):
+        if self.root is None:
+            print(f"Save failed: {error}")
+        else:
+            messagebox.showerror("Save Failed", f"Your changes could not be saved:\n{error}")
+
+
+_worker = None
+
+
+def get_persistence():
+    """Process-wide persistence worker"""
+    global _worker
+    if _worker is None:
+        _worker = PersistenceWorker()
+    return _worker
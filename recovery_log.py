@@ -0,0 +1,143 @@
+# recovery_log.py - WRITE-AHEAD LOG FOR SAVES THAT SPAN SEVERAL STORES
+"""
+A credential save writes the vault and the audit log; a password reset
+writes users.json and the audit log. Each store is crash-safe on its own,
+but a crash between the writes used to leave the stores disagreeing.
+
+RecoveryLog.run(operations) makes such a save all-or-nothing:
+
+    1. the operations are appended to recovery.log as one record
+       (length u32 | crc32 u32 | JSON) and fsynced
+    2. every operation is applied to its store
+    3. the group-committed files they touched are flushed, so the whole
+       change is on disk
+    4. the log is emptied
+
+On the next start recover() replays a record left behind by a crash
+between 1 and 4. Replaying is harmless: vault puts and user puts are by
+key, deletes of missing ids are no-ops and audit entries already in the
+log are skipped. A record whose length or checksum does not match was
+torn before step 1 finished, so none of it was applied; it is dropped
+(rolled back). A save that failed half-way with an I/O error stays in
+the log too and is finished by the next run() or recover(); when the
+next run() is the retry of that save, its audit entries are not added
+twice. Operations are JSON lists: ["vault.put_many", user,
+records], ["vault.delete", user, cred_id], ["users.put", username, data]
+and ["audit", entry]. Vault records are already sealed, so no plaintext
+reaches the log.
+
+The log is locked while an operation runs, which also serializes
+multi-store saves of several app instances. Cost per save: one small
+append plus fsync, and the audit log is written at once instead of with
+the next group commit.
+"""
+import json
+import os
+import struct
+import zlib
+from durable_io import flush_pending
+from file_locks import exclusive_lock
+from storage import get_repository
+
+RECOVERY_LOG = "recovery.log"
+RECORD_HEADER = struct.Struct("<II")   # payload length, crc32 of payload
+
+
+def apply_operation(repository, operation, replay=False):
+    """Apply one logged operation; returns the group-committed file it queued, if any"""
+    kind, args = operation[0], operation[1:]
+    if kind == "vault.put_many":
+        repository.vault.put_many(*args)
+        return None
+    if kind == "vault.delete":
+        repository.vault.delete(*args)
+        return None
+    if kind == "users.put":
+        repository.users.put(*args)
+        # JSON users go through group commit; SQLite has committed already
+        return getattr(repository.users, "file_path", None)
+    if kind == "audit":
+        from audit_log import AuditLog
+        AuditLog.append_entry(args[0], once=replay)
+        return AuditLog.LOG_FILE
+    raise ValueError(f"Unknown recovery log operation: {kind}")
+
+
+class RecoveryLog:
+    """Write-ahead log that makes a multi-store save atomic across crashes"""
+
+    def __init__(self, repository, path=RECOVERY_LOG):
+        self.repository = repository
+        self.path = path
+
+    def run(self, operations):
+        """Log operations durably, apply them, flush what they queued, then clear the log"""
+        payload = json.dumps(operations, separators=(",", ":")).encode()
+        with exclusive_lock(self.path):
+            # A save that failed half-way is still in the log: finish it first,
+            # then empty the log so the new record does not land behind a torn one
+            self.replay()
+            self.clear()
+            with open(self.path, "ab") as f:
+                f.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+                f.flush()
+                os.fsync(f.fileno())
+            # A retried save carries the audit entries the replay may just have written
+            self.apply(operations, replay=True)
+            self.clear()
+
+    def apply(self, operations, replay=False):
+        queued = set()
+        for operation in operations:
+            path = apply_operation(self.repository, operation, replay)
+            if path is not None:
+                queued.add(path)
+        if queued:
+            flush_pending(queued)
+
+    def read(self):
+        """Operation lists of the complete records in the log; a torn tail is ignored"""
+        if not os.path.exists(self.path) or not os.path.getsize(self.path):
+            return []
+        with open(self.path, "rb") as f:
+            data = f.read()
+
+        transactions = []
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(data):
+            length, checksum = RECORD_HEADER.unpack_from(data, offset)
+            payload = data[offset + RECORD_HEADER.size:offset + RECORD_HEADER.size + length]
+            if len(payload) != length or zlib.crc32(payload) != checksum:
+                break
+            transactions.append(json.loads(payload))
+            offset += RECORD_HEADER.size + length
+        return transactions
+
+    def replay(self):
+        transactions = self.read()
+        for operations in transactions:
+            self.apply(operations, replay=True)
+        return len(transactions)
+
+    def recover(self):
+        """Replay saves a crash interrupted; returns how many were replayed"""
+        with exclusive_lock(self.path):
+            replayed = self.replay()
+            self.clear()
+        return replayed
+
+    def clear(self):
+        # Not fsynced: if the truncation is lost, the record is replayed harmlessly
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+            os.truncate(self.path, 0)
+
+
+_recovery_log = None
+
+
+def get_recovery_log():
+    """Process-wide recovery log for the process-wide repository"""
+    global _recovery_log
+    if _recovery_log is None:
+        _recovery_log = RecoveryLog(get_repository())
+    return _recovery_log
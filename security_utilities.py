@@ -3,16 +3,15 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 import string
 import random
-import json
-import os
 from datetime import datetime, timedelta
+from storage import get_repository
+from persistence import get_persistence
 
 class SecurityUtilities:
     def __init__(self, root, dashboard_callback, current_user):
         self.root = root
         self.dashboard_callback = dashboard_callback
         self.current_user = current_user
-        self.settings_file = "settings.json"
         
         # Initialize gen_options BEFORE calling show_security_screen
         self.gen_options = {
@@ -30,13 +29,12 @@ class SecurityUtilities:
         
     def load_settings(self):
         """Load user settings"""
-        if os.path.exists(self.settings_file):
-            with open(self.settings_file, "r") as f:
-                self.settings = json.load(f)
+        self.settings = {}
+        get_persistence().drain()   # a queued save_settings must land first
+        user_settings = get_repository().settings.get(self.current_user)
+        if user_settings is not None:
+            self.settings[self.current_user] = user_settings
         else:
-            self.settings = {}
-        
-        if self.current_user not in self.settings:
             self.settings[self.current_user] = {
                 "auto_lock_time": 1,
                 "lock_after_failed_attempts": True,
@@ -46,9 +44,9 @@ class SecurityUtilities:
             self.save_settings()
     
     def save_settings(self):
-        """Save settings to file"""
-        with open(self.settings_file, "w") as f:
-            json.dump(self.settings, f, indent=4)
+        """Save the current user's settings on the persistence thread"""
+        get_persistence().submit(get_repository().settings.put,
+                                 self.current_user, dict(self.settings[self.current_user]))
     
     def show_security_screen(self):
         """Display security utilities screen"""
@@ -0,0 +1,48 @@
+# session_cache.py - DECRYPTED CREDENTIAL CACHE FOR THE LOGGED-IN SESSION
+from store_cache import store_cache
+
+
+class CredentialCache:
+    """
+    Holds the decrypted credential list of the logged-in user so the dashboard
+    and the credential manager share one copy instead of decrypting the vault
+    on every screen switch. The list is edited in place by the credential
+    screens; it is dropped when the user's vault files change underneath it
+    (another process wrote them) and at logout.
+    """
+
+    def __init__(self, vault_store):
+        self.vault_store = vault_store
+        self.clear()
+
+    def get(self, user):
+        """Return the cached list for user, or None if it must be (re)loaded"""
+        if self.user != user or self.credentials is None:
+            store_cache.record("credentials", hit=False)
+            return None
+        if self.vault_store.stat_signature(user) != self.signature:
+            self.clear()
+            store_cache.record("credentials", hit=False)
+            return None
+        store_cache.record("credentials", hit=True)
+        return self.credentials
+
+    def fill(self, user, credentials, signature=None):
+        """signature: taken before the records were read (default: now)"""
+        self.user = user
+        self.credentials = credentials
+        self.signature = self.vault_store.stat_signature(user) if signature is None else signature
+
+    def refresh_signature(self, user, before, after):
+        """
+        Accept our own write: before/after are the signatures taken around
+        it. If the files had already changed before it (another writer, an
+        import), the cache stays stale and is reloaded.
+        """
+        if self.user == user and self.signature == before:
+            self.signature = after
+
+    def clear(self):
+        self.user = None
+        self.credentials = None
+        self.signature = None
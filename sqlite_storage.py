@@ -0,0 +1,201 @@
+# sqlite_storage.py - SQLITE BACKEND (WAL MODE) FOR USERS, SETTINGS AND VAULT
+import json
+import os
+import sqlite3
+import threading
+from storage import Repository, JsonKeyValueStore, USERS_FILE, SETTINGS_FILE, VAULT_FILE, VAULT_JOURNAL, VAULT_DIR
+from vault_shards import ShardedVaultStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    data     TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS settings (
+    username TEXT PRIMARY KEY,
+    data     TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS credentials (
+    id      TEXT PRIMARY KEY,
+    owner   TEXT NOT NULL,
+    seq     INTEGER NOT NULL,
+    record  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_credentials_owner ON credentials (owner, seq);
+"""
+
+
+class SqliteStorage:
+    """
+    Single SQLite database holding users, settings and encrypted credentials.
+    The connection is shared by the UI and the persistence worker thread, so
+    every statement or transaction runs under one lock.
+    """
+
+    def __init__(self, db_file="secure_vault.db"):
+        self.db_file = db_file
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def repository(self):
+        return SqliteRepository(
+            self,
+            SqliteKeyValueStore(self.conn, "users", self.lock, f"{self.db_file}.users"),
+            SqliteKeyValueStore(self.conn, "settings", self.lock, f"{self.db_file}.settings"),
+            SqliteVaultStore(self.conn, self.lock)
+        )
+
+    def is_empty(self):
+        with self.lock:
+            for table in ("users", "settings", "credentials"):
+                if self.conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+                    return False
+        return True
+
+    def import_json(self):
+        """Copy users.json, settings.json and the JSON vault into the database"""
+        users = JsonKeyValueStore(USERS_FILE).all()
+        settings = JsonKeyValueStore(SETTINGS_FILE).all()
+
+        vault = ShardedVaultStore(VAULT_DIR, VAULT_FILE, VAULT_JOURNAL)
+        has_vault = (os.path.exists(VAULT_DIR) or os.path.exists(VAULT_FILE)
+                     or os.path.exists(VAULT_JOURNAL))
+        if has_vault:
+            vault.initialize()
+
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO users (username, data) VALUES (?, ?)",
+                [(name, json.dumps(data)) for name, data in users.items()]
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO settings (username, data) VALUES (?, ?)",
+                [(name, json.dumps(data)) for name, data in settings.items()]
+            )
+            if has_vault:
+                for user in vault.users():
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO credentials (id, owner, seq, record) VALUES (?, ?, ?, ?)",
+                        [(record["id"], user, seq, json.dumps(record))
+                         for seq, record in enumerate(vault.get_user_records(user), 1)]
+                    )
+        vault.close()
+
+
+class SqliteRepository(Repository):
+    def __init__(self, storage, users, settings, vault):
+        super().__init__("sqlite", users, settings, vault)
+        self.storage = storage
+
+    def initialize(self):
+        """Import the JSON stores the first time an empty database is opened"""
+        if self.storage.is_empty():
+            self.storage.import_json()
+        self.vault.initialize()
+
+
+class SqliteKeyValueStore:
+    """{username: dict} table with the same interface as JsonKeyValueStore"""
+
+    def __init__(self, conn, table, lock, lock_path):
+        self.conn = conn
+        self.table = table
+        self.lock = lock
+        self.lock_path = lock_path   # base name for inter-process locks (see JsonKeyValueStore)
+
+    def all(self):
+        with self.lock:
+            rows = self.conn.execute(f"SELECT username, data FROM {self.table}").fetchall()
+        return {username: json.loads(data) for username, data in rows}
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT data FROM {self.table} WHERE username = ?", (key,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, value):
+        with self.lock, self.conn:
+            self.conn.execute(
+                f"INSERT INTO {self.table} (username, data) VALUES (?, ?) "
+                "ON CONFLICT(username) DO UPDATE SET data = excluded.data",
+                (key, json.dumps(value))
+            )
+
+    def flush(self):
+        pass   # put() has committed already
+
+
+class SqliteVaultStore:
+    """Vault store interface (see VaultJournal) backed by the credentials table"""
+
+    def __init__(self, conn, lock):
+        self.conn = conn
+        self.lock = lock
+
+    def initialize(self):
+        pass
+
+    def get_user_records(self, user):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT record FROM credentials WHERE owner = ? ORDER BY seq", (user,)
+            ).fetchall()
+        return [json.loads(record) for (record,) in rows]
+
+    def count_user_records(self, user):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM credentials WHERE owner = ?", (user,)
+            ).fetchone()[0]
+
+    def page_user_records(self, user, start, count):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT record FROM credentials WHERE owner = ? ORDER BY seq LIMIT ? OFFSET ?",
+                (user, count, start)
+            ).fetchall()
+        return [json.loads(record) for (record,) in rows]
+
+    def stat_signature(self, user):
+        # data_version only moves when another connection commits
+        with self.lock:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    PUT_SQL = ("INSERT INTO credentials (id, owner, seq, record) VALUES "
+               "(?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM credentials WHERE owner = ?), ?) "
+               "ON CONFLICT(id) DO UPDATE SET record = excluded.record")
+
+    def put(self, user, record):
+        # New ids go to the end of the user's list; updates keep their position
+        with self.lock, self.conn:
+            self.conn.execute(self.PUT_SQL, (record["id"], user, user, json.dumps(record)))
+
+    def put_many(self, user, records):
+        """Several puts in one transaction"""
+        with self.lock, self.conn:
+            self.conn.executemany(
+                self.PUT_SQL, [(record["id"], user, user, json.dumps(record)) for record in records]
+            )
+
+    def delete(self, user, cred_id):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM credentials WHERE id = ? AND owner = ?", (cred_id, user)
+            )
+
+    def users(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT DISTINCT owner FROM credentials").fetchall()
+        return [owner for (owner,) in rows]
+
+    def compact(self):
+        with self.lock:
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        self.compact()
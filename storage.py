@@ -0,0 +1,91 @@
+# storage.py - REPOSITORY LAYER FOR USERS, SETTINGS AND VAULT
+import copy
+import os
+from durable_io import flush_pending, load_json, update_json
+from vault_shards import ShardedVaultStore
+
+USERS_FILE = "users.json"
+SETTINGS_FILE = "settings.json"
+VAULT_FILE = "vault.json"
+VAULT_JOURNAL = "vault.journal"
+VAULT_DIR = "vault"
+DATABASE_FILE = "secure_vault.db"
+
+# "json" (default), "binary" / "mapped" (JSON users/settings, .vlt / .vmap
+# vault shards) or "sqlite"
+BACKEND_ENV = "SECURE_VAULT_BACKEND"
+
+VAULT_SNAPSHOT_EXT = {"json": ".json", "binary": ".vlt", "mapped": ".vmap"}
+
+
+class JsonKeyValueStore:
+    """
+    {key: dict} store kept in a single JSON file (users.json, settings.json).
+    Saves are atomic, group-committed and merged with other app instances'
+    saves (see durable_io).
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.lock_path = file_path   # base name for locks around multi-step updates
+
+    def all(self):
+        return copy.deepcopy(load_json(self.file_path, {}))
+
+    def get(self, key):
+        # Copy one entry instead of the whole (cached) document
+        return copy.deepcopy(load_json(self.file_path, {}).get(key))
+
+    def put(self, key, value):
+        value = copy.deepcopy(value)   # the caller may keep editing its dict
+
+        def apply(data):
+            data[key] = value
+            return data
+        update_json(self.file_path, apply, {})
+
+    def flush(self):
+        """Write queued puts now instead of with the next group commit"""
+        flush_pending([self.file_path])
+
+
+class Repository:
+    """Bundle of the three stores the app works with"""
+
+    def __init__(self, backend, users, settings, vault):
+        self.backend = backend
+        self.users = users
+        self.settings = settings
+        self.vault = vault
+
+    def initialize(self):
+        self.vault.initialize()
+
+    def close(self):
+        self.vault.close()
+
+
+def open_repository(backend="json"):
+    """Create a repository for the given backend name"""
+    if backend in VAULT_SNAPSHOT_EXT:
+        return Repository(
+            backend,
+            JsonKeyValueStore(USERS_FILE),
+            JsonKeyValueStore(SETTINGS_FILE),
+            ShardedVaultStore(VAULT_DIR, VAULT_FILE, VAULT_JOURNAL, VAULT_SNAPSHOT_EXT[backend])
+        )
+    if backend == "sqlite":
+        from sqlite_storage import SqliteStorage
+        return SqliteStorage(DATABASE_FILE).repository()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+_repository = None
+
+
+def get_repository():
+    """Process-wide repository, chosen by $SECURE_VAULT_BACKEND on first use"""
+    global _repository
+    if _repository is None:
+        _repository = open_repository(os.environ.get(BACKEND_ENV, "json"))
+    return _repository
@@ -0,0 +1,76 @@
+# store_cache.py - PARSED STORE CACHE WITH CHANGE DETECTION
+import os
+import threading
+from collections import Counter
+
+
+def file_key(path):
+    """(inode, mtime_ns, size) of path, or None if it does not exist"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class StoreCache:
+    """
+    Parsed contents of store files, reused until the file's (inode,
+    mtime_ns, size) changes. Atomic saves replace the file, so any write by
+    this or another instance gives it a new key and the next read reparses.
+    Cached objects are shared: callers must copy before editing them.
+
+    Hits and misses are counted per store name for report().
+    """
+
+    def __init__(self):
+        self.entries = {}    # path -> (file key, parsed object)
+        self.hits = Counter()
+        self.misses = Counter()
+        self.lock = threading.Lock()
+
+    def get(self, path, parse, store=None):
+        """parse(path) result for the current file, or None if it does not exist"""
+        store = store or os.path.basename(path)
+        # Stat before reading: a write in between gives a newer file under an
+        # older key, which only costs one extra parse next time
+        key = file_key(path)
+        if key is None:
+            return None
+        with self.lock:
+            entry = self.entries.get(path)
+        if entry is not None and entry[0] == key:
+            self.record(store, hit=True)
+            return entry[1]
+
+        value = parse(path)
+        with self.lock:
+            self.entries[path] = (key, value)
+        self.record(store, hit=False)
+        return value
+
+    def record(self, store, hit):
+        """Count a lookup made by a store with its own change detection (vault shards)"""
+        with self.lock:
+            (self.hits if hit else self.misses)[store] += 1
+
+    def invalidate(self, path):
+        with self.lock:
+            self.entries.pop(path, None)
+
+    def stats(self):
+        """{store: (hits, misses, hit rate)}"""
+        with self.lock:
+            stores = set(self.hits) | set(self.misses)
+            return {store: (self.hits[store], self.misses[store],
+                            self.hits[store] / (self.hits[store] + self.misses[store]))
+                    for store in sorted(stores)}
+
+    def report(self):
+        lines = [f"{'store':>16} {'hits':>7} {'misses':>7} {'hit rate':>9}"]
+        for store, (hits, misses, rate) in self.stats().items():
+            lines.append(f"{store:>16} {hits:>7} {misses:>7} {rate:>8.0%}")
+        return "\n".join(lines)
+
+
+store_cache = StoreCache()
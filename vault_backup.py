@@ -0,0 +1,337 @@
+# vault_backup.py - STREAMING ENCRYPTED BACKUP ARCHIVES (CHUNKED AEAD)
+"""
+Backup archive of stored vault records, written and read frame by frame so
+neither side holds the vault in memory.
+
+    Header (33 bytes)   magic "SVLTBKUP" | version u8 | frame size u32
+                        | salt 16 bytes | nonce prefix 4 bytes
+    Frame               sealed length u32 | AES-256-GCM(payload)
+
+Each frame is authenticated on its own. Its nonce is the archive's nonce
+prefix plus the frame number, and its associated data is the header plus
+(frame number, final flag), so frames cannot be reordered, moved between
+archives or dropped from the end: a complete archive ends with an empty
+frame flagged final. The key comes from the vault key and the archive salt
+(EncryptionManager.backup_cipher). Reading tries every key in the ring and
+the keys retired by past rotations, so archives made before a rotation
+still restore; their records are re-sealed under the current key on the
+way in.
+
+Payloads are JSON lines {"u": owner, "i": position, "r": stored record};
+records stay in their own envelopes. A frame holds whole lines, up to
+FRAME_SIZE bytes, which is what makes resuming possible:
+
+    export  resume=True verifies the partial archive, drops a torn last
+            frame and continues after the last record it holds
+    restore resume=True skips frames already applied, per the cursor in
+            "<archive>.cursor"; puts are by credential id, so replaying a
+            frame twice is harmless
+
+    python vault_backup.py export vault.bak
+    python vault_backup.py restore vault.bak
+"""
+import json
+import os
+import struct
+import sys
+import time
+from cryptography.exceptions import InvalidTag
+from durable_io import atomic_write_json
+
+MAGIC = b"SVLTBKUP"
+BACKUP_VERSION = 1
+FRAME_SIZE = 64 * 1024
+PAGE_SIZE = 500
+SALT_SIZE = 16
+NONCE_PREFIX_SIZE = 4
+
+HEADER = struct.Struct(f"<8sBI{SALT_SIZE}s{NONCE_PREFIX_SIZE}s")
+FRAME_LENGTH = struct.Struct("<I")
+FRAME_AAD = struct.Struct("<QB")
+TAG_SIZE = 16
+
+
+class BackupError(Exception):
+    """Archive is corrupt, truncated or was made with another vault key"""
+
+
+class BackupResult:
+    def __init__(self):
+        self.records = 0
+        self.skipped = 0
+        self.frames = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def summary(self):
+        rate = self.records / self.seconds if self.seconds else 0.0
+        summary = (f"{self.records} records in {self.frames} frames ({self.bytes / 1e6:.2f} MB) "
+                   f"in {self.seconds:.2f}s ({rate:.0f} records/s)")
+        if self.skipped:
+            summary += f"; {self.skipped} skipped, sealed with another user's key"
+        return summary
+
+
+def frame_nonce(prefix, number):
+    return prefix + number.to_bytes(8, "little")
+
+
+# ---------------- Reading ----------------
+class BackupReader:
+    """Verifies and decrypts an archive one frame at a time"""
+
+    def __init__(self, path, encryption):
+        self.file = open(path, "rb")
+        header = self.file.read(HEADER.size)
+        if len(header) != HEADER.size:
+            raise BackupError("Not a backup archive")
+        magic, version, self.frame_size, salt, self.nonce_prefix = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise BackupError("Not a backup archive")
+        if version != BACKUP_VERSION:
+            raise BackupError(f"Unsupported backup version: {version}")
+        self.header = header
+        self.ciphers = encryption.backup_ciphers(salt)
+        self.cipher = None      # the one that opened the first frame
+        self.key_index = None   # its position in ciphers: 0 is the current key
+        self.complete = False
+        self.valid_end = HEADER.size   # file offset after the last verified frame
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.file.close()
+
+    def frames(self, start=0):
+        """(frame number, payload) of every verified frame; frames before start are skipped unopened"""
+        number = 0
+        while True:
+            prefix = self.file.read(FRAME_LENGTH.size)
+            if not prefix:
+                return
+            if len(prefix) != FRAME_LENGTH.size:
+                raise BackupError(f"Truncated frame {number}")
+            (length,) = FRAME_LENGTH.unpack(prefix)
+            if length > self.frame_size + TAG_SIZE:
+                raise BackupError(f"Frame {number} is larger than the archive's frame size")
+            sealed = self.file.read(length)
+            if len(sealed) != length:
+                raise BackupError(f"Truncated frame {number}")
+
+            if number >= start:
+                payload = None
+                for final in (0, 1):
+                    try:
+                        payload = self.open_frame(number, sealed, final)
+                    except InvalidTag:
+                        continue
+                    if final:
+                        self.complete = True
+                    break
+                if payload is None:
+                    raise BackupError(f"Frame {number} failed authentication")
+                self.valid_end = self.file.tell()
+                if self.complete:
+                    return
+                yield number, payload
+            number += 1
+
+    def open_frame(self, number, sealed, final):
+        nonce = frame_nonce(self.nonce_prefix, number)
+        aad = self.header + FRAME_AAD.pack(number, final)
+        if self.cipher is not None:
+            return self.cipher.decrypt(nonce, sealed, aad)
+        # First frame opened: find the key the archive was written under
+        for index, cipher in enumerate(self.ciphers):
+            try:
+                payload = cipher.decrypt(nonce, sealed, aad)
+            except InvalidTag:
+                continue
+            self.cipher, self.key_index = cipher, index
+            return payload
+        raise InvalidTag()
+
+    def records(self, start=0):
+        """(frame number, entry) for every record, entry = {"u", "i", "r"}"""
+        for number, payload in self.frames(start):
+            for line in payload.splitlines():
+                yield number, json.loads(line)
+
+
+# ---------------- Writing ----------------
+class BackupWriter:
+    """Appends whole JSON lines to an archive, sealing a frame whenever it fills"""
+
+    def __init__(self, path, encryption, frame_size=FRAME_SIZE, resume_at=None):
+        if resume_at is None:
+            self.file = open(path, "wb")
+            salt = os.urandom(SALT_SIZE)
+            self.nonce_prefix = os.urandom(NONCE_PREFIX_SIZE)
+            self.header = HEADER.pack(MAGIC, BACKUP_VERSION, frame_size, salt, self.nonce_prefix)
+            self.file.write(self.header)
+            self.frame_size = frame_size
+            self.number = 0
+        else:
+            # resume_at = (reader of the partial archive, next frame number)
+            reader, self.number = resume_at
+            self.header = reader.header
+            self.nonce_prefix = reader.nonce_prefix
+            self.frame_size = reader.frame_size
+            self.file = open(path, "r+b")
+            self.file.truncate(reader.valid_end)
+            self.file.seek(reader.valid_end)
+        self.cipher = encryption.backup_cipher(HEADER.unpack(self.header)[3])
+        self.buffer = bytearray()
+
+    def write_entry(self, entry):
+        line = json.dumps(entry, separators=(",", ":")).encode() + b"\n"
+        if len(line) > self.frame_size:
+            raise BackupError("Record is larger than the archive's frame size")
+        if self.buffer and len(self.buffer) + len(line) > self.frame_size:
+            self.seal()
+        self.buffer += line
+
+    def seal(self, final=False):
+        sealed = self.cipher.encrypt(frame_nonce(self.nonce_prefix, self.number), bytes(self.buffer),
+                                     self.header + FRAME_AAD.pack(self.number, int(final)))
+        self.file.write(FRAME_LENGTH.pack(len(sealed)) + sealed)
+        self.number += 1
+        self.buffer = bytearray()
+
+    def close(self):
+        """Seal the last records plus the final marker frame and fsync"""
+        if self.buffer:
+            self.seal()
+        self.seal(final=True)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+
+# ---------------- Export ----------------
+def export_vault(path, vault_store, encryption, users=None, resume=False, progress=None):
+    """
+    Stream the stored records of users (default: every user) into an
+    archive at path. With resume=True an interrupted export at path is
+    continued after its last verified record.
+    """
+    result = BackupResult()
+    start_time = time.perf_counter()
+    users = list(users) if users is not None else vault_store.users()
+
+    resume_at = None
+    position = None   # (owner, index) of the last record already in the archive
+    if resume and os.path.exists(path):
+        with BackupReader(path, encryption) as reader:
+            if reader.complete:
+                raise BackupError("Archive is already complete")
+            next_frame = 0
+            try:
+                for number, entry in reader.records():
+                    position = (entry["u"], entry["i"])
+                    next_frame = number + 1
+                    result.records += 1
+            except BackupError:
+                pass   # torn frame from the interruption; rewritten below
+            if reader.key_index in (None, 0):
+                resume_at = (reader, next_frame)
+            else:
+                # Started under a key rotated out since: new frames must not use it
+                position = None
+                result.records = 0
+
+    writer = BackupWriter(path, encryption, resume_at=resume_at)
+    try:
+        for user in users:
+            first = 0
+            if position is not None:
+                if user != position[0]:
+                    continue   # finished before the interruption
+                first, position = position[1] + 1, None
+
+            while True:
+                page = vault_store.page_user_records(user, first, PAGE_SIZE)
+                for offset, record in enumerate(page):
+                    writer.write_entry({"u": user, "i": first + offset, "r": record})
+                result.records += len(page)
+                first += len(page)
+                if progress is not None:
+                    progress(result)
+                if len(page) < PAGE_SIZE:
+                    break
+    except BaseException:
+        writer.file.close()   # leave a resumable partial archive
+        raise
+    writer.close()
+
+    result.frames = writer.number
+    result.bytes = os.path.getsize(path)
+    result.seconds = time.perf_counter() - start_time
+    return result
+
+
+# ---------------- Restore ----------------
+def restore_vault(path, vault_store, encryption, user=None, resume=False, progress=None):
+    """
+    Verify the archive frame by frame and put its records into vault_store,
+    one put_many per frame, under their original owners (or all under user).
+    Records sealed under a retired installation key are re-sealed under the
+    current one. Restoring into user keeps only the user-key records that
+    encryption (unlocked as that user) opens: another user's would make the
+    vault fail to load. Progress is kept in "<path>.cursor" so resume=True skips applied frames.
+    Raises BackupError if a frame fails authentication or the archive is
+    truncated; frames before that point have already been restored.
+    """
+    result = BackupResult()
+    start_time = time.perf_counter()
+    cursor_file = path + ".cursor"
+
+    start = 0
+    if resume and os.path.exists(cursor_file):
+        with open(cursor_file, "r") as f:
+            start = json.load(f)["next_frame"]
+
+    # Records from before a rotation are sealed under a retired key
+    archive_keys = encryption.with_retired_keys()
+    with BackupReader(path, encryption) as reader:
+        for number, payload in reader.frames(start):
+            batches = {}
+            for line in payload.splitlines():
+                entry = json.loads(line)
+                if user is not None and encryption.foreign_record(entry["r"]):
+                    result.skipped += 1
+                    continue
+                record = archive_keys.rotate_record(entry["r"]) or entry["r"]
+                batches.setdefault(user or entry["u"], []).append(record)
+            for owner, records in batches.items():
+                vault_store.put_many(owner, records)
+                result.records += len(records)
+            result.frames += 1
+            atomic_write_json(cursor_file, {"next_frame": number + 1})
+            if progress is not None:
+                progress(result)
+        if not reader.complete:
+            raise BackupError("Archive is truncated: final frame missing")
+
+    os.remove(cursor_file)
+    result.bytes = os.path.getsize(path)
+    result.seconds = time.perf_counter() - start_time
+    return result
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("export", "restore"):
+        print("usage: python vault_backup.py export|restore ARCHIVE [--resume]")
+        sys.exit(1)
+    from encryption import EncryptionManager
+    from storage import get_repository
+
+    repository = get_repository()
+    repository.initialize()
+    manager = EncryptionManager()
+    action = export_vault if sys.argv[1] == "export" else restore_vault
+    outcome = action(sys.argv[2], repository.vault, manager, resume="--resume" in sys.argv)
+    repository.close()
+    manager.shutdown()
+    print(outcome.summary())
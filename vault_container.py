@@ -0,0 +1,183 @@
+# vault_container.py - COMPACT BINARY VAULT CONTAINER
+"""
+Binary alternative to the indented JSON vault snapshot.
+
+    Header (16 bytes)   magic "SVLTCONT" | version u16 | flags u16 | section count u32
+    Section (one per owner)
+                        owner len u16 | record count u32 | owner utf-8
+                        | kinds       u8  x count
+                        | id lengths  u16 x count
+                        | body lengths u32 x count
+                        | ids (utf-8, concatenated) | bodies (concatenated)
+
+All integers are little-endian. The per-record fields are stored as
+columns so loading decodes each column in one call instead of unpacking
+record by record.
+
+Envelope records (kind 1) store the raw envelope bytes instead of base64
+text inside a JSON string; the payload was already compressed before it
+was encrypted (see EncryptionManager.encrypt_record). Envelope records
+with a blind index (kind 2, version 2 containers) store tag count u8 |
+raw tags | envelope bytes. Legacy three-token records (kind 0) are kept
+as compact JSON.
+
+Convert an existing file:
+    python vault_container.py to-binary vault.json vault.vlt
+    python vault_container.py to-json vault.vlt vault.json
+"""
+import base64
+import json
+import struct
+import sys
+from array import array
+from itertools import accumulate
+from blind_index import TAG_SIZE
+from durable_io import atomic_write, atomic_write_json
+
+MAGIC = b"SVLTCONT"
+CONTAINER_VERSION = 2   # 2 added kind 2; version 1 containers still load
+
+HEADER = struct.Struct("<8sHHI")
+SECTION_HEADER = struct.Struct("<HI")
+
+KIND_JSON = 0
+KIND_ENVELOPE = 1
+KIND_INDEXED_ENVELOPE = 2
+
+
+def le_array(typecode, values=()):
+    """array in little-endian byte order, whatever the host order is"""
+    column = array(typecode, values)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column
+
+
+def encode_body(record):
+    """(kind, body) of one record: raw envelope bytes when the record allows it, else compact JSON"""
+    if "envelope" in record:
+        if len(record) == 2:
+            return KIND_ENVELOPE, base64.urlsafe_b64decode(record["envelope"])
+        tags = record.get("index")
+        if (len(record) == 3 and tags is not None and len(tags) < 256
+                and all(len(tag) == 2 * TAG_SIZE for tag in tags)):
+            return KIND_INDEXED_ENVELOPE, b"".join([bytes([len(tags)])] + [bytes.fromhex(tag) for tag in tags]
+                                                   + [base64.urlsafe_b64decode(record["envelope"])])
+    return KIND_JSON, json.dumps(record, separators=(",", ":")).encode()
+
+
+def decode_body(cred_id, kind, body):
+    """Stored record from its id and the body written by encode_body (bytes or memoryview)"""
+    if kind == KIND_ENVELOPE:
+        return {"id": cred_id, "envelope": base64.urlsafe_b64encode(body).decode()}
+    if kind == KIND_INDEXED_ENVELOPE:
+        end = 1 + body[0] * TAG_SIZE
+        tags = bytes(body[1:end]).hex()
+        return {"id": cred_id, "envelope": base64.urlsafe_b64encode(body[end:]).decode(),
+                "index": [tags[i:i + 2 * TAG_SIZE] for i in range(0, len(tags), 2 * TAG_SIZE)]}
+    return json.loads(bytes(body))
+
+
+def encode_container(vault):
+    """{owner: [records]} -> container bytes"""
+    parts = [HEADER.pack(MAGIC, CONTAINER_VERSION, 0, len(vault))]
+    for owner, records in vault.items():
+        kinds = bytearray()
+        ids = []
+        bodies = []
+        for record in records:
+            ids.append(record["id"].encode())
+            kind, body = encode_body(record)
+            kinds.append(kind)
+            bodies.append(body)
+
+        owner_bytes = owner.encode()
+        parts.append(SECTION_HEADER.pack(len(owner_bytes), len(records)))
+        parts.append(owner_bytes)
+        parts.append(bytes(kinds))
+        parts.append(le_array("H", map(len, ids)).tobytes())
+        parts.append(le_array("I", map(len, bodies)).tobytes())
+        parts.extend(ids)
+        parts.extend(bodies)
+    return b"".join(parts)
+
+
+def read_column(data, offset, typecode, count):
+    column = array(typecode)
+    end = offset + column.itemsize * count
+    column.frombytes(data[offset:end])
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column, end
+
+
+def decode_container(data):
+    """Container bytes -> {owner: [records]}"""
+    magic, version, flags, sections = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a vault container")
+    if not 1 <= version <= CONTAINER_VERSION:
+        raise ValueError(f"Unsupported container version: {version}")
+
+    vault = {}
+    offset = HEADER.size
+    b64encode = base64.urlsafe_b64encode
+    for _ in range(sections):
+        owner_len, count = SECTION_HEADER.unpack_from(data, offset)
+        offset += SECTION_HEADER.size
+        owner = data[offset:offset + owner_len].decode()
+        offset += owner_len
+
+        kinds = data[offset:offset + count]
+        offset += count
+        id_lengths, offset = read_column(data, offset, "H", count)
+        body_lengths, offset = read_column(data, offset, "I", count)
+
+        id_ends = list(accumulate(id_lengths, initial=offset))
+        offset = id_ends[-1]
+        body_ends = list(accumulate(body_lengths, initial=offset))
+        offset = body_ends[-1]
+
+        records = []
+        for i, kind in enumerate(kinds):
+            body = data[body_ends[i]:body_ends[i + 1]]
+            if kind == KIND_ENVELOPE:
+                records.append({"id": data[id_ends[i]:id_ends[i + 1]].decode(),
+                                "envelope": b64encode(body).decode()})
+            else:
+                records.append(decode_body(data[id_ends[i]:id_ends[i + 1]].decode(), kind, body))
+        vault[owner] = records
+    return vault
+
+
+def read_container(path):
+    with open(path, "rb") as f:
+        return decode_container(f.read())
+
+
+def write_container(path, vault):
+    atomic_write(path, encode_container(vault))
+
+
+def is_container(path):
+    return path.endswith(".vlt")
+
+
+# ---------------- Converters ----------------
+def json_to_container(json_path, container_path):
+    with open(json_path, "r") as f:
+        write_container(container_path, json.load(f))
+
+
+def container_to_json(container_path, json_path):
+    atomic_write_json(json_path, read_container(container_path))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] not in ("to-binary", "to-json"):
+        print("usage: python vault_container.py to-binary|to-json SOURCE DEST")
+        sys.exit(1)
+    if sys.argv[1] == "to-binary":
+        json_to_container(sys.argv[2], sys.argv[3])
+    else:
+        container_to_json(sys.argv[2], sys.argv[3])
@@ -0,0 +1,239 @@
+# vault_journal.py - APPEND-ONLY VAULT JOURNAL WITH SNAPSHOT COMPACTION
+import json
+import os
+import uuid
+from durable_io import atomic_write, atomic_write_json
+from file_locks import exclusive_lock, shared_lock
+from store_cache import file_key, store_cache
+from vault_container import encode_container, is_container, read_container
+from vault_mmap import MappedVault, encode_mapped_vault, is_mapped, read_mapped_vault
+
+
+class VaultJournal:
+    """
+    Vault store made of a snapshot file plus an append-only journal.
+    Every edit appends one encrypted record (put) or a tombstone (delete)
+    keyed by credential id. Once the journal grows past compact_threshold
+    entries it is folded back into the snapshot.
+
+    A snapshot path ending in .vlt is stored as a binary container, one
+    ending in .vmap as a memory-mapped vault (see vault_mmap). If the
+    snapshot is missing but one of fallback_snapshots exists (the same shard
+    in another format), that file is read and converted on the next
+    compaction.
+
+    Several app instances may share the files: reads hold a shared lock and
+    appends/compactions an exclusive one (on "<journal>.lock"). Before
+    writing, the stat signature loaded last is compared with the files; if
+    another instance wrote in between, the vault is reloaded first instead
+    of being overwritten with a stale copy.
+    """
+
+    def __init__(self, snapshot_file="vault.json", journal_file="vault.journal", compact_threshold=200,
+                 fallback_snapshots=()):
+        self.snapshot_file = snapshot_file
+        self.journal_file = journal_file
+        self.compact_threshold = compact_threshold
+        self.fallback_snapshots = fallback_snapshots
+
+        self.lock_file = journal_file   # same lock whatever the snapshot format
+
+        self.vault = None          # {username: {cred_id: encrypted record}}
+        self.journal_entries = 0
+        self.torn_offset = None    # end of the last whole journal line if a torn one follows it
+        self.loaded_signature = None
+
+    # ---------------- Loading ----------------
+    def load(self):
+        """Load the snapshot and replay the journal tail on top of it"""
+        with shared_lock(self.lock_file):
+            needs_compaction = self.read_state()
+        if needs_compaction:
+            self.compact()
+
+    def read_state(self):
+        """Read snapshot + journal into memory; True if the snapshot should be rewritten"""
+        self.vault = {}
+        needs_compaction = False
+
+        snapshot = None
+        if os.path.exists(self.snapshot_file):
+            snapshot = self.read_snapshot(self.snapshot_file)
+        else:
+            for fallback in self.fallback_snapshots:
+                if os.path.exists(fallback):
+                    snapshot = self.read_snapshot(fallback)
+                    needs_compaction = True
+                    break
+
+        if snapshot is not None:
+            for user, records in snapshot.items():
+                user_records = self.vault.setdefault(user, {})
+                for record in records:
+                    # Records written before the journal existed have no id
+                    if "id" not in record:
+                        record["id"] = uuid.uuid4().hex
+                        needs_compaction = True
+                    user_records[record["id"]] = record
+
+        self.journal_entries = 0
+        self.torn_offset = None
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, "rb") as f:
+                offset = 0
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn final line from an interrupted append: it must
+                        # go before anything is appended after it
+                        self.torn_offset = offset
+                        needs_compaction = True
+                        break
+                    self.apply_entry(entry)
+                    self.journal_entries += 1
+                    offset += len(line)
+
+        self.loaded_signature = self.stat_signature()
+        return needs_compaction
+
+    def is_stale(self):
+        """True if nothing is loaded or another instance changed the files since"""
+        return self.vault is None or self.stat_signature() != self.loaded_signature
+
+    @staticmethod
+    def read_snapshot(path):
+        if is_container(path):
+            return read_container(path)
+        if is_mapped(path):
+            return read_mapped_vault(path)
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def ensure_loaded(self):
+        """Load on first use, and again if another process changed the files"""
+        stale = self.is_stale()
+        store_cache.record("vault", hit=not stale)
+        if stale:
+            self.load()
+
+    def apply_entry(self, entry):
+        """Apply a single journal entry to the in-memory vault"""
+        user_records = self.vault.setdefault(entry["user"], {})
+        if entry["op"] == "put":
+            user_records[entry["record"]["id"]] = entry["record"]
+        elif entry["op"] == "delete":
+            user_records.pop(entry["id"], None)
+
+    # ---------------- Reads ----------------
+    def get_user_records(self, user):
+        """Return the encrypted records of one user in insertion order"""
+        self.ensure_loaded()
+        return list(self.vault.get(user, {}).values())
+
+    def can_map(self):
+        """True if the .vmap snapshot alone is the current state (no journal tail, nothing loaded)"""
+        return (self.vault is None and is_mapped(self.snapshot_file)
+                and os.path.exists(self.snapshot_file) and not os.path.exists(self.journal_file))
+
+    def count_user_records(self, user):
+        with shared_lock(self.lock_file):
+            if self.can_map():
+                with MappedVault(self.snapshot_file) as mapped:
+                    return mapped.count_user_records(user)
+        self.ensure_loaded()
+        return len(self.vault.get(user, {}))
+
+    def page_user_records(self, user, start, count):
+        """
+        Records start..start+count of one user. A .vmap snapshot with no
+        journal tail is served straight from the mapping without loading the
+        rest of the file.
+        """
+        with shared_lock(self.lock_file):
+            if self.can_map():
+                with MappedVault(self.snapshot_file) as mapped:
+                    return mapped.user_records(user, start, start + count)
+        return self.get_user_records(user)[start:start + count]
+
+    def stat_signature(self, user=None):
+        """(inode, mtime_ns, size) of the snapshot and journal; changes on any write"""
+        return (file_key(self.snapshot_file), file_key(self.journal_file))
+
+    # ---------------- Writes ----------------
+    def put(self, user, record):
+        """Insert or replace one encrypted record (must carry an 'id')"""
+        self.append({"op": "put", "user": user, "record": record})
+
+    def put_many(self, user, records):
+        """Insert or replace several records with one journal write and fsync"""
+        self.append_many([{"op": "put", "user": user, "record": record} for record in records])
+
+    def delete(self, user, cred_id):
+        """Remove one record by credential id"""
+        self.append({"op": "delete", "user": user, "id": cred_id})
+
+    def append(self, entry):
+        self.append_many([entry])
+
+    def append_many(self, entries):
+        with exclusive_lock(self.lock_file):
+            self.ensure_loaded()
+            for entry in entries:
+                self.apply_entry(entry)
+
+            if self.torn_offset is not None:
+                os.truncate(self.journal_file, self.torn_offset)
+                self.torn_offset = None
+            with open(self.journal_file, "a") as f:
+                f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+                f.flush()
+                os.fsync(f.fileno())
+            self.journal_entries += len(entries)
+            self.loaded_signature = self.stat_signature()
+
+            if self.journal_entries >= self.compact_threshold:
+                self.compact()
+
+    # ---------------- Compaction ----------------
+    def compact(self):
+        """Fold the journal into a fresh snapshot and truncate the journal"""
+        with exclusive_lock(self.lock_file):
+            if self.is_stale():
+                self.read_state()
+            self.write_snapshot()
+
+    def replace(self, vault):
+        """Make vault ({username: {cred_id: record}}) the whole content of this store"""
+        with exclusive_lock(self.lock_file):
+            self.vault = vault
+            self.write_snapshot()
+
+    def write_snapshot(self):
+        snapshot = {user: list(records.values()) for user, records in self.vault.items()}
+
+        # Replaying the old journal over the new snapshot is idempotent, so a
+        # crash between the rename and the journal removal loses nothing.
+        if is_container(self.snapshot_file):
+            atomic_write(self.snapshot_file, encode_container(snapshot))
+        elif is_mapped(self.snapshot_file):
+            atomic_write(self.snapshot_file, encode_mapped_vault(snapshot))
+        else:
+            atomic_write_json(self.snapshot_file, snapshot)
+
+        for fallback in self.fallback_snapshots:
+            if os.path.exists(fallback):
+                os.remove(fallback)
+
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+        self.journal_entries = 0
+        self.torn_offset = None
+        self.loaded_signature = self.stat_signature()
+
+    def close(self):
+        """Compact pending journal entries before shutdown"""
+        if self.vault is not None and self.journal_entries:
+            self.compact()
@@ -0,0 +1,224 @@
+# vault_keys.py - PER-USER VAULT KEYS WRAPPED BY THE MASTER PASSWORD
+"""
+Every user has a random 256-bit vault key. Envelopes sealed while the user
+is logged in use it (record version 4, EncryptionManager.unlock). Records
+sealed under the installation key in vault_key.key are re-sealed under
+it in the background after each login (migrate_user_records): those
+saved before the user had a key, and those imported or restored by the
+command-line tools while the user was logged out. Until that pass
+finishes, anyone holding vault_key.key can still open them.
+
+The key lives in the user's entry of the users store, wrapped under the
+master password:
+
+    "vault_key": {"kdf": "scrypt", "n": 32768, "r": 8, "p": 1, "salt": ...,
+                  "wrapped":  AES-256-GCM(scrypt(master password), key),
+                  "recovery": AES-256-GCM(installation recovery key, key)}
+
+Login derives the scrypt key once, in parallel with the bcrypt check,
+unwraps the vault key and hands it to the EncryptionManager for the whole
+session; logout zeroes it. The scrypt cost is tunable: KDF_N (or
+$SECURE_VAULT_KDF_N) applies to new wraps, and entries made with other
+parameters are re-wrapped at their next login.
+
+The "recovery" wrap is OFF by default. It lets the forgot-password
+screen re-wrap the same key under a new password without knowing the old
+one. But the recovery key is derived from vault_key.key, which sits in
+the data directory: with recovery on, anyone holding a copy of the data
+directory can unwrap every user's vault key, and the master password no
+longer protects it. Only turn it on ($SECURE_VAULT_KEY_RECOVERY=1) where
+the data directory itself is protected. The setting is applied to each
+entry at the user's next login (wrap added or removed). Without a
+recovery wrap a forgotten master password cannot be reset, because the
+user's records could not be opened again.
+"""
+import base64
+import os
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+from file_locks import exclusive_lock
+
+KDF_N_ENV = "SECURE_VAULT_KDF_N"
+RECOVERY_ENV = "SECURE_VAULT_KEY_RECOVERY"
+KDF_N = 2 ** 15   # 32 MiB of memory, about 0.1 s per derivation
+KDF_R = 8
+KDF_P = 1
+SALT_SIZE = 16
+KEY_SIZE = 32
+NONCE_SIZE = 12
+MIGRATION_BATCH_SIZE = 500
+
+
+class VaultKeyError(Exception):
+    """A wrapped vault key could not be opened"""
+
+
+# ---------------- Key Derivation ----------------
+def kdf_params(entry=None):
+    """scrypt parameters of a key entry, or fresh ones (new salt) for a new wrap"""
+    if entry is not None:
+        return {name: entry[name] for name in ("kdf", "n", "r", "p", "salt")}
+    return {
+        "kdf": "scrypt",
+        "n": int(os.environ.get(KDF_N_ENV, KDF_N)),
+        "r": KDF_R,
+        "p": KDF_P,
+        "salt": base64.b64encode(os.urandom(SALT_SIZE)).decode(),
+    }
+
+
+def params_current(params):
+    current = kdf_params()
+    return all(params[name] == current[name] for name in ("kdf", "n", "r", "p"))
+
+
+def derive_wrapping_key(password, params):
+    """The slow, memory-hard step; run once per login"""
+    if params["kdf"] != "scrypt":
+        raise VaultKeyError(f"Unknown key derivation: {params['kdf']}")
+    return Scrypt(salt=base64.b64decode(params["salt"]), length=KEY_SIZE,
+                  n=params["n"], r=params["r"], p=params["p"]).derive(password.encode())
+
+
+def recovery_enabled():
+    return os.environ.get(RECOVERY_ENV) == "1"
+
+
+# ---------------- Wrapping ----------------
+def seal_key(cipher, key, username):
+    # The username is authenticated data: an entry cannot be moved to another user
+    nonce = os.urandom(NONCE_SIZE)
+    return base64.b64encode(nonce + cipher.encrypt(nonce, bytes(key), username.encode())).decode()
+
+
+def open_key(cipher, sealed, username):
+    data = base64.b64decode(sealed)
+    try:
+        return bytearray(cipher.decrypt(data[:NONCE_SIZE], data[NONCE_SIZE:], username.encode()))
+    except InvalidTag:
+        raise VaultKeyError(f"Vault key of {username} could not be unwrapped") from None
+
+
+def wrap_user_key(username, key, params, wrapping_key, recovery_cipher):
+    """Key entry for the users store; the recovery wrap only if recovery is enabled"""
+    entry = dict(params)
+    entry["wrapped"] = seal_key(AESGCM(wrapping_key), key, username)
+    if recovery_enabled():
+        entry["recovery"] = seal_key(recovery_cipher, key, username)
+    return entry
+
+
+def key_recoverable(user_data):
+    """True if a forgot-password reset can keep the user's vault key"""
+    entry = user_data.get("vault_key")
+    return entry is None or "recovery" in entry
+
+
+def unlock_user_key(username, user_data, password, params, wrapping_key, recovery_cipher):
+    """
+    The user's vault key (bytearray) after a successful password check,
+    given the wrapping key derived with params. Creates the key on the
+    first login since per-user keys and re-wraps stale entries (old scrypt
+    parameters, recovery wrap not matching the setting). Returns (key,
+    changed); when changed, user_data["vault_key"] must be saved.
+    """
+    entry = user_data.get("vault_key")
+    if entry is None:
+        key = bytearray(os.urandom(KEY_SIZE))
+        user_data["vault_key"] = wrap_user_key(username, key, params, wrapping_key, recovery_cipher)
+        return key, True
+
+    try:
+        key = open_key(AESGCM(wrapping_key), entry["wrapped"], username)
+        if params_current(entry):
+            if ("recovery" in entry) == recovery_enabled():
+                return key, False
+            user_data["vault_key"] = wrap_user_key(username, key, params, wrapping_key, recovery_cipher)
+            return key, True
+    except VaultKeyError:
+        # bcrypt accepted the password, so the entry predates a password
+        # change made without re-wrapping; only a recovery wrap still opens it
+        if "recovery" not in entry:
+            raise
+        key = open_key(recovery_cipher, entry["recovery"], username)
+
+    fresh = kdf_params()
+    user_data["vault_key"] = wrap_user_key(username, key, fresh, derive_wrapping_key(password, fresh),
+                                           recovery_cipher)
+    return key, True
+
+
+def unlock_stored_key(users, username, password, params, wrapping_key, recovery_cipher):
+    """
+    unlock_user_key for the entry in the users store; returns (key, user_data).
+    Runs under a lock next to the store with the entry re-read inside it,
+    so two instances logging in for the first time agree on one key, and a
+    new or re-wrapped entry is flushed to disk before anything is sealed
+    with the key. params/wrapping_key were derived from the entry read
+    before the lock; they are derived again if it has changed since.
+    """
+    with exclusive_lock(users.lock_path + ".vault_key"):
+        user_data = users.get(username)
+        entry = user_data.get("vault_key")
+        if entry is not None and kdf_params(entry) != params:
+            params = kdf_params(entry)
+            wrapping_key = derive_wrapping_key(password, params)
+        key, changed = unlock_user_key(username, user_data, password, params, wrapping_key, recovery_cipher)
+        if changed:
+            users.put(username, user_data)
+            users.flush()
+    return key, user_data
+
+
+def reset_user_key(username, user_data, new_password, recovery_cipher):
+    """
+    Forgot-password reset: re-wrap the existing vault key under new_password.
+    Raises VaultKeyError if the entry has no recovery wrap (see key_recoverable).
+    """
+    entry = user_data.get("vault_key")
+    if entry is None:
+        return   # created at the next login
+    if "recovery" not in entry:
+        raise VaultKeyError(f"Vault key of {username} has no recovery wrap")
+    key = open_key(recovery_cipher, entry["recovery"], username)
+    params = kdf_params()
+    user_data["vault_key"] = wrap_user_key(username, key, params, derive_wrapping_key(new_password, params),
+                                           recovery_cipher)
+    key[:] = bytes(len(key))
+
+
+def rewrap_recovery(username, user_data, recovery_ciphers):
+    """
+    Key rotation: move the recovery wrap to the current installation key
+    (recovery_ciphers[0]). Returns True if user_data changed.
+    """
+    entry = user_data.get("vault_key")
+    if entry is None or "recovery" not in entry:
+        return False
+    for index, cipher in enumerate(recovery_ciphers):
+        try:
+            key = open_key(cipher, entry["recovery"], username)
+        except VaultKeyError:
+            continue
+        if index:
+            entry["recovery"] = seal_key(recovery_ciphers[0], key, username)
+        key[:] = bytes(len(key))
+        return index > 0
+    raise VaultKeyError(f"Recovery wrap of {username} matches no installation key")
+
+
+# ---------------- Installation-Key Records ----------------
+def migrate_user_records(vault_store, encryption, user, position=0, batch_size=MIGRATION_BATCH_SIZE):
+    """
+    Re-seal one page of the user's records under their vault key
+    (encryption must be unlocked as user). Returns the position of the
+    next page, or None once the vault has been scanned. Records already
+    under the user's key are only checked, so a pass cut short by logout
+    simply starts over at the next login.
+    """
+    page = vault_store.page_user_records(user, position, batch_size)
+    resealed = [record for record in map(encryption.seal_for_user, page) if record is not None]
+    if resealed:
+        vault_store.put_many(user, resealed)
+    return position + len(page) if len(page) == batch_size else None
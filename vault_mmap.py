@@ -0,0 +1,164 @@
+# vault_mmap.py - MEMORY-MAPPED VAULT WITH RECORD OFFSET TABLE
+"""
+Vault snapshot format built for random access through mmap.
+
+    Header (36 bytes)   magic "SVLTMMAP" | version u16 | flags u16
+                        | owner count u32 | record count u32
+                        | owner table offset u64 | record table offset u64
+    Owner table         per owner: name offset u64 | name len u16
+                                   | first record u32 | record count u32
+    Record table        per record: data offset u64 | data length u32
+    Names               owner names, utf-8, concatenated
+    Record data         kind u8 | id len u16 | id utf-8 | body
+
+Records of one owner are contiguous, so "all credentials of a user" is one
+range of the record table and "credential N" is a single table lookup.
+Only the header, the owner table and the touched records are read; the OS
+pages the rest of the file in on demand. Bodies are the raw envelope bytes
+(kind 1), blind index tags plus envelope bytes (kind 2, version 2 files) or
+compact JSON for legacy records (kind 0), as in vault_container.
+
+Convert an existing snapshot:
+    python vault_mmap.py vault.json vault.vmap
+"""
+import mmap
+import struct
+import sys
+from durable_io import atomic_write
+from vault_container import decode_body, encode_body
+
+MAGIC = b"SVLTMMAP"
+MAPPED_VERSION = 2   # 2 added kind 2; version 1 files still open
+
+HEADER = struct.Struct("<8sHHIIQQ")
+OWNER_ENTRY = struct.Struct("<QHII")
+RECORD_ENTRY = struct.Struct("<QI")
+RECORD_PREFIX = struct.Struct("<BH")
+
+
+def is_mapped(path):
+    return path.endswith(".vmap")
+
+
+def encode_record(record):
+    id_bytes = record["id"].encode()
+    kind, body = encode_body(record)
+    return RECORD_PREFIX.pack(kind, len(id_bytes)) + id_bytes + body
+
+
+def decode_record(data):
+    kind, id_len = RECORD_PREFIX.unpack_from(data, 0)
+    body_start = RECORD_PREFIX.size + id_len
+    return decode_body(bytes(data[RECORD_PREFIX.size:body_start]).decode(), kind, data[body_start:])
+
+
+def encode_mapped_vault(vault):
+    """{owner: [records]} -> mapped vault bytes"""
+    owners = list(vault)
+    names = [owner.encode() for owner in owners]
+    records = [encode_record(record) for owner in owners for record in vault[owner]]
+
+    owner_table_offset = HEADER.size
+    record_table_offset = owner_table_offset + OWNER_ENTRY.size * len(owners)
+    names_offset = record_table_offset + RECORD_ENTRY.size * len(records)
+
+    parts = [HEADER.pack(MAGIC, MAPPED_VERSION, 0, len(owners), len(records),
+                         owner_table_offset, record_table_offset)]
+
+    name_offset = names_offset
+    first = 0
+    for owner, name in zip(owners, names):
+        parts.append(OWNER_ENTRY.pack(name_offset, len(name), first, len(vault[owner])))
+        name_offset += len(name)
+        first += len(vault[owner])
+
+    data_offset = name_offset
+    for record in records:
+        parts.append(RECORD_ENTRY.pack(data_offset, len(record)))
+        data_offset += len(record)
+
+    parts.extend(names)
+    parts.extend(records)
+    return b"".join(parts)
+
+
+def write_mapped_vault(path, vault):
+    atomic_write(path, encode_mapped_vault(vault))
+
+
+class MappedVault:
+    """Read-only random access to a .vmap file; use as a context manager"""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, flags, owner_count, self.record_count,
+         owner_table_offset, self.record_table_offset) = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("Not a mapped vault")
+        if not 1 <= version <= MAPPED_VERSION:
+            self.close()
+            raise ValueError(f"Unsupported mapped vault version: {version}")
+
+        self.owners = {}   # owner -> (first record, record count)
+        for i in range(owner_count):
+            name_offset, name_len, first, count = OWNER_ENTRY.unpack_from(
+                self.map, owner_table_offset + i * OWNER_ENTRY.size)
+            name = self.map[name_offset:name_offset + name_len].decode()
+            self.owners[name] = (first, count)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __len__(self):
+        return self.record_count
+
+    def record(self, n):
+        """Stored record number n (0-based, across all owners)"""
+        if not 0 <= n < self.record_count:
+            raise IndexError(n)
+        offset, length = RECORD_ENTRY.unpack_from(
+            self.map, self.record_table_offset + n * RECORD_ENTRY.size)
+        return decode_record(memoryview(self.map)[offset:offset + length])
+
+    def count_user_records(self, user):
+        return self.owners.get(user, (0, 0))[1]
+
+    def user_records(self, user, start=0, stop=None):
+        """Stored records start..stop of one owner, reading only those records"""
+        first, count = self.owners.get(user, (0, 0))
+        start = max(start, 0)
+        stop = count if stop is None else min(stop, count)
+        if start >= stop:
+            return []
+        # One slice of the offset table covers the whole range
+        table_start = self.record_table_offset + (first + start) * RECORD_ENTRY.size
+        table = self.map[table_start:table_start + (stop - start) * RECORD_ENTRY.size]
+        view = memoryview(self.map)
+        return [decode_record(view[offset:offset + length])
+                for offset, length in RECORD_ENTRY.iter_unpack(table)]
+
+    def to_vault(self):
+        return {user: self.user_records(user) for user in self.owners}
+
+
+def read_mapped_vault(path):
+    with MappedVault(path) as mapped:
+        return mapped.to_vault()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("usage: python vault_mmap.py SOURCE(.json|.vlt) DEST.vmap")
+        sys.exit(1)
+    from vault_journal import VaultJournal
+    write_mapped_vault(sys.argv[2], VaultJournal.read_snapshot(sys.argv[1]))
@@ -0,0 +1,157 @@
+# vault_shards.py - PER-USER SHARDED VAULT WITH DIRECTORY INDEX
+import hashlib
+import json
+import os
+from durable_io import atomic_write_json
+from file_locks import exclusive_lock, shared_lock
+from vault_journal import VaultJournal
+
+SNAPSHOT_EXTENSIONS = (".json", ".vlt", ".vmap")
+
+
+class ShardedVaultStore:
+    """
+    Vault store with one journaled shard per user plus a small index file.
+    Layout:
+        vault/index.json          {username: shard name}
+        vault/<shard>.json        snapshot of that user's records
+                                  (<shard>.vlt binary container or <shard>.vmap
+                                  mapped vault, depending on snapshot_ext)
+        vault/<shard>.journal     append-only tail for that user
+    Loading or saving one user never touches another user's files. Shards in
+    another snapshot format are converted the first time they are compacted.
+    """
+
+    def __init__(self, directory="vault", legacy_file="vault.json", legacy_journal="vault.journal",
+                 snapshot_ext=".json"):
+        self.directory = directory
+        self.snapshot_ext = snapshot_ext
+        self.index_file = os.path.join(directory, "index.json")
+        self.legacy_file = legacy_file
+        self.legacy_journal = legacy_journal
+
+        self.index = None
+        self.shards = {}   # username -> open VaultJournal
+
+    # ---------------- Setup & Migration ----------------
+    def initialize(self):
+        """Create the shard directory, migrating the single-file vault if present"""
+        os.makedirs(self.directory, exist_ok=True)
+        # Exclusive so two instances starting together migrate only once
+        with exclusive_lock(self.index_file):
+            if os.path.exists(self.index_file):
+                self.load_index()
+            elif os.path.exists(self.legacy_file) or os.path.exists(self.legacy_journal):
+                self.migrate_legacy()
+            else:
+                self.index = {}
+                self.save_index()
+
+    def migrate_legacy(self):
+        """Split vault.json (plus its journal) into one shard per user"""
+        legacy = VaultJournal(self.legacy_file, self.legacy_journal)
+        legacy.load()
+
+        # Shards are written before the index: until the index exists a
+        # restart simply runs the migration again over the same files.
+        self.index = {}
+        for user in legacy.vault:
+            self.shard_for(user).replace({user: legacy.vault[user]})
+        self.save_index()
+
+        if os.path.exists(self.legacy_file):
+            os.replace(self.legacy_file, self.legacy_file + ".migrated")
+        if os.path.exists(self.legacy_journal):
+            os.remove(self.legacy_journal)
+
+    # ---------------- Index ----------------
+    def load_index(self):
+        with shared_lock(self.index_file):
+            with open(self.index_file, "r") as f:
+                self.index = json.load(f)
+
+    def save_index(self):
+        atomic_write_json(self.index_file, self.index)
+
+    def ensure_index(self):
+        if self.index is None:
+            self.initialize()
+
+    @staticmethod
+    def shard_name(user):
+        """Stable, filesystem-safe shard name for a username"""
+        return hashlib.sha256(user.encode()).hexdigest()[:16]
+
+    def shard_for(self, user, create=True):
+        """Return the journal for a user's shard, opening it on first use"""
+        if user in self.shards:
+            return self.shards[user]
+
+        if user not in self.index:
+            with exclusive_lock(self.index_file):
+                # Another instance may have added the user since the index was read
+                if os.path.exists(self.index_file):
+                    self.load_index()
+                if user not in self.index:
+                    if not create:
+                        return None
+                    self.index[user] = self.shard_name(user)
+                    if os.path.exists(self.index_file):
+                        self.save_index()
+
+        base = os.path.join(self.directory, self.index[user])
+        fallbacks = tuple(base + ext for ext in SNAPSHOT_EXTENSIONS if ext != self.snapshot_ext)
+        shard = VaultJournal(base + self.snapshot_ext, base + ".journal", fallback_snapshots=fallbacks)
+        self.shards[user] = shard
+        return shard
+
+    # ---------------- Store Interface ----------------
+    def get_user_records(self, user):
+        self.ensure_index()
+        shard = self.shard_for(user, create=False)
+        if shard is None:
+            return []
+        return shard.get_user_records(user)
+
+    def count_user_records(self, user):
+        self.ensure_index()
+        shard = self.shard_for(user, create=False)
+        return shard.count_user_records(user) if shard else 0
+
+    def page_user_records(self, user, start, count):
+        self.ensure_index()
+        shard = self.shard_for(user, create=False)
+        if shard is None:
+            return []
+        return shard.page_user_records(user, start, count)
+
+    def stat_signature(self, user):
+        self.ensure_index()
+        shard = self.shard_for(user, create=False)
+        return shard.stat_signature() if shard else None
+
+    def put(self, user, record):
+        self.ensure_index()
+        self.shard_for(user).put(user, record)
+
+    def put_many(self, user, records):
+        self.ensure_index()
+        self.shard_for(user).put_many(user, records)
+
+    def delete(self, user, cred_id):
+        self.ensure_index()
+        self.shard_for(user).delete(user, cred_id)
+
+    def users(self):
+        self.ensure_index()
+        return list(self.index)
+
+    def compact(self):
+        for shard in self.shards.values():
+            shard.compact()
+
+    def close(self):
+        """Compact open shards and drop them from memory"""
+        for shard in self.shards.values():
+            shard.close()
+        self.shards = {}